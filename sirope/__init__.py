@@ -1,2 +1,19 @@
 from sirope.oid import OID
 from sirope.sirope_main import Sirope
+from sirope.replicas import ReplicaSet
+from sirope.registry import register
+from sirope.session import Session
+from sirope.writebehind import WriteBehind
+from sirope.writebehind import WriteBehindError
+from sirope.changefeed import ChangeFeed
+from sirope.changefeed import Change
+from sirope.changefeed import ChangeConsumer
+from sirope.aggregates import Metric
+from sirope.aggregates import count
+from sirope.aggregates import sum_
+from sirope.aggregates import avg
+from sirope.aggregates import min_
+from sirope.aggregates import max_
+from sirope.unique import UniqueConstraintError
+from sirope.backends import MemoryBackend
+from sirope.backends import SQLiteBackend
@@ -0,0 +1,74 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+# Usage:
+#   python -m sirope export <module.Class>... [-o <file>]
+#   python -m sirope import [<file>...]
+
+
+import sys
+import argparse
+import redis
+
+from sirope.sirope_main import Sirope
+from sirope import transfer
+
+
+def report(num: int, elapsed: float):
+    rate = num / elapsed if elapsed > 0 else 0.0
+    print(f"\r{num} objects, {elapsed:.1f}s, {rate:.0f} obj/s",
+          end="", file=sys.stderr, flush=True)
+
+
+def main(argv: "list[str]|None"=None) -> int:
+    parser = argparse.ArgumentParser(
+                prog="python -m sirope",
+                description="Exports and imports Sirope classes as NDJSON.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=Sirope.CHUNK_SIZE)
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="export classes")
+    export_cmd.add_argument("namespaces", nargs="+", metavar="module.Class")
+    export_cmd.add_argument("-o", "--output", help="file (default: stdout)")
+
+    import_cmd = commands.add_parser("import", help="import files")
+    import_cmd.add_argument("files", nargs="*",
+                            help="files (default: stdin)")
+
+    args = parser.parse_args(argv)
+    srp = Sirope(redis.Redis(host=args.host, port=args.port, db=args.db))
+    progress = None if args.quiet else report
+    num = 0
+
+    if args.command == "export":
+        out = open(args.output, "w") if args.output else sys.stdout
+
+        try:
+            for ns in args.namespaces:
+                num += transfer.export_ns(srp, ns, out,
+                                          args.chunk_size, progress)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        for path in args.files or ["-"]:
+            if path == "-":
+                num += transfer.import_ns(srp, sys.stdin,
+                                          args.chunk_size, progress)
+            else:
+                with open(path) as f:
+                    num += transfer.import_ns(srp, f,
+                                              args.chunk_size, progress)
+
+    if progress:
+        print(file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
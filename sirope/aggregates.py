@@ -0,0 +1,84 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+class Metric:
+    """A metric computed by Sirope.aggregate() over a field."""
+    COUNT = "count"
+    SUM = "sum"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    KINDS = (COUNT, SUM, AVG, MIN, MAX)
+
+    def __init__(self, kind: str, field: "str|None"=None):
+        """Creates a metric.
+            :param kind: One of Metric.KINDS.
+            :param field: The field, or None for count.
+        """
+        if kind not in Metric.KINDS:
+            raise ValueError("invalid metric: " + str(kind))
+
+        if not field and kind != Metric.COUNT:
+            raise ValueError(kind + "(): missing field")
+
+        self._kind = kind
+        self._field = field
+
+    @property
+    def kind(self) -> str:
+        return self._kind
+
+    @property
+    def field(self) -> "str|None":
+        return self._field
+
+    def result(self, num: int, stats: "dict|None") -> "int|float|None":
+        """Returns the value of the metric for a group.
+            :param num: The number of objects in the group.
+            :param stats: The count (n), sum (s), min (mn) and max (mx)
+                          of the numeric values of the field in the group.
+        """
+        if not self._field:
+            return num
+
+        if not stats:
+            return 0 if self._kind in (Metric.COUNT, Metric.SUM) else None
+
+        if self._kind == Metric.COUNT:
+            return stats["n"]
+        elif self._kind == Metric.SUM:
+            return stats["s"]
+        elif self._kind == Metric.AVG:
+            return stats["s"] / stats["n"]
+        elif self._kind == Metric.MIN:
+            return stats["mn"]
+
+        return stats["mx"]
+
+    def __str__(self) -> str:
+        return f"{self.kind}({self.field or ''})"
+
+
+def count(field: "str|None"=None) -> Metric:
+    """Number of objects, or of objects with a numeric value in field."""
+    return Metric(Metric.COUNT, field)
+
+
+def sum_(field: str) -> Metric:
+    """Sum of the numeric values of field."""
+    return Metric(Metric.SUM, field)
+
+
+def avg(field: str) -> Metric:
+    """Average of the numeric values of field."""
+    return Metric(Metric.AVG, field)
+
+
+def min_(field: str) -> Metric:
+    """Minimum of the numeric values of field."""
+    return Metric(Metric.MIN, field)
+
+
+def max_(field: str) -> Metric:
+    """Maximum of the numeric values of field."""
+    return Metric(Metric.MAX, field)
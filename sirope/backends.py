@@ -0,0 +1,486 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+# Embedded storage backends, to be passed to Sirope in place of a
+# redis.Redis object. They implement the hash commands (get/set/scan),
+# counters and pipelines Sirope and SafeIndex rely on, with the same
+# signatures and results as redis-py. Features implemented through
+# Lua scripts (change feeds, unique fields, expiry, aggregations)
+# need a Redis server.
+
+
+import time
+import bisect
+import sqlite3
+import threading
+from typing import Iterable
+
+import redis
+
+
+class Backend:
+    """Base class of embedded backends."""
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def hget(self, name, key) -> "bytes|None":
+        raise NotImplementedError()
+
+    def hmget(self, name, keys, *args) -> "list[bytes|None]":
+        raise NotImplementedError()
+
+    def hset(self, name, key=None, value=None, mapping=None) -> int:
+        raise NotImplementedError()
+
+    def hdel(self, name, *keys) -> int:
+        raise NotImplementedError()
+
+    def hlen(self, name) -> int:
+        raise NotImplementedError()
+
+    def hincrby(self, name, key, amount: int=1) -> int:
+        raise NotImplementedError()
+
+    def hscan(self, name, cursor: int=0, match=None, count=None,
+              no_values=None) -> tuple:
+        raise NotImplementedError()
+
+    def flushdb(self, *args, **kwargs) -> bool:
+        raise NotImplementedError()
+
+    def hexists(self, name, key) -> bool:
+        return self.hget(name, key) is not None
+
+    def hscan_iter(self, name, match=None, count=None,
+                   no_values=None) -> Iterable:
+        cursor = 0
+        while True:
+            cursor, data = self.hscan(name, cursor, match, count, no_values)
+            yield from (data if no_values else data.items())
+
+            if cursor == 0:
+                break
+
+    def hkeys(self, name) -> "list[bytes]":
+        return list(self.hscan_iter(name, no_values=True))
+
+    def hvals(self, name) -> "list[bytes]":
+        return [v for _, v in self.hscan_iter(name)]
+
+    def hgetall(self, name) -> "dict[bytes, bytes]":
+        return dict(self.hscan_iter(name))
+
+    def pipeline(self, transaction: bool=True,
+                 shard_hint=None) -> "BackendPipeline":
+        return BackendPipeline(self)
+
+    def _run_atomically(self, commands: list) -> list:
+        """Runs the commands (name, args, kwargs) as a transaction."""
+        with self._lock:
+            return [getattr(self, name)(*args, **kwargs)
+                    for name, args, kwargs in commands]
+
+    def register_script(self, script: str) -> "UnsupportedScript":
+        return UnsupportedScript(script)
+
+    def execute_command(self, *args, **options):
+        raise redis.ResponseError("unknown command '" + str(args[0]) + "'")
+
+    def ping(self, **kwargs) -> bool:
+        return True
+
+    def time(self) -> "tuple[int, int]":
+        now = time.time_ns() // 1000
+        return now // 1000000, now % 1000000
+
+    @staticmethod
+    def _to_bytes(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        elif isinstance(value, str):
+            return value.encode("utf-8")
+        elif isinstance(value, (int, float)):
+            return repr(value).encode("ascii")
+
+        raise redis.DataError("invalid value: " + repr(value))
+
+    @staticmethod
+    def _to_name(name) -> str:
+        if isinstance(name, bytes):
+            return name.decode("utf-8", "replace")
+
+        return str(name)
+
+    @staticmethod
+    def _keys_from(keys, args) -> list:
+        if isinstance(keys, (bytes, str, int, float)):
+            keys = [keys]
+
+        return [Backend._to_bytes(k) for k in list(keys) + list(args)]
+
+    @staticmethod
+    def _mapping_from(key, value, mapping) -> "dict[bytes, bytes]":
+        toret = {}
+
+        if key is not None:
+            toret[Backend._to_bytes(key)] = Backend._to_bytes(value)
+
+        for k, v in (mapping or {}).items():
+            toret[Backend._to_bytes(k)] = Backend._to_bytes(v)
+
+        if not toret:
+            raise redis.DataError("hset(): no key/value pairs")
+
+        return toret
+
+
+class BackendPipeline:
+    """Buffers commands for a backend, running them all on execute(),
+       as a transaction. After watch(), commands run immediately
+       until multi(), and the backend is locked until execute(),
+       so watched data cannot change in the meantime.
+    """
+    def __init__(self, backend: Backend):
+        self._backend = backend
+        self._commands = []
+        self._watching = False
+        self._buffering = True
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(self._backend,
+                                                        name, None)):
+            raise AttributeError(name)
+
+        if not self._buffering:
+            return getattr(self._backend, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def __enter__(self) -> "BackendPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def watch(self, *names):
+        if not self._watching:
+            self._backend._lock.acquire()
+            self._watching = True
+
+        self._buffering = False
+
+    def multi(self):
+        self._buffering = True
+
+    def execute(self, raise_on_error: bool=True) -> list:
+        commands = self._commands
+        self._commands = []
+
+        try:
+            return self._backend._run_atomically(commands)
+        finally:
+            self.reset()
+
+    def reset(self):
+        self._commands = []
+        self._buffering = True
+
+        if self._watching:
+            self._watching = False
+            self._backend._lock.release()
+
+
+class UnsupportedScript:
+    """Stands for a Lua script, which embedded backends cannot run."""
+    def __init__(self, script: str):
+        self.script = script
+
+    def __call__(self, keys=None, args=None, client=None):
+        raise NotImplementedError("Lua scripts need a Redis server")
+
+
+class _MemoryHash:
+    """A hash which can be scanned in insertion order while it changes.
+       Each field has a sequence number, used as the scan cursor.
+    """
+    def __init__(self):
+        self.data: "dict[bytes, list]" = {}
+        self.seqs: "list[int]" = []
+        self.keys: "list[bytes]" = []
+        self.last_seq = 0
+        self.stale = 0
+
+    def set(self, key: bytes, value: bytes) -> int:
+        entry = self.data.get(key)
+
+        if entry:
+            entry[1] = value
+            return 0
+
+        self.last_seq += 1
+        self.data[key] = [self.last_seq, value]
+        self.seqs.append(self.last_seq)
+        self.keys.append(key)
+        return 1
+
+    def delete(self, key: bytes) -> int:
+        if self.data.pop(key, None) is None:
+            return 0
+
+        self.stale += 1
+        if self.stale > 64 and self.stale > len(self.data):
+            live = [(s, k) for s, k in zip(self.seqs, self.keys)
+                    if self.data.get(k, (None,))[0] == s]
+            self.seqs = [s for s, _ in live]
+            self.keys = [k for _, k in live]
+            self.stale = 0
+
+        return 1
+
+    def scan(self, cursor: int, count: int) -> "tuple[int, list]":
+        toret = []
+        i = bisect.bisect_right(self.seqs, cursor)
+
+        while i < len(self.seqs) and len(toret) < count:
+            entry = self.data.get(self.keys[i])
+
+            if entry and entry[0] == self.seqs[i]:
+                toret.append((self.keys[i], entry[1]))
+
+            i += 1
+
+        return (self.seqs[i - 1] if i < len(self.seqs) else 0), toret
+
+
+class MemoryBackend(Backend):
+    """Keeps all data in memory, in this process."""
+    def __init__(self):
+        super().__init__()
+        self._hashes: "dict[str, _MemoryHash]" = {}
+
+    def hget(self, name, key) -> "bytes|None":
+        h = self._hashes.get(Backend._to_name(name))
+        entry = h.data.get(Backend._to_bytes(key)) if h else None
+        return entry[1] if entry else None
+
+    def hmget(self, name, keys, *args) -> "list[bytes|None]":
+        h = self._hashes.get(Backend._to_name(name))
+        data = h.data if h else {}
+        toret = []
+
+        for k in Backend._keys_from(keys, args):
+            entry = data.get(k)
+            toret.append(entry[1] if entry else None)
+
+        return toret
+
+    def hset(self, name, key=None, value=None, mapping=None) -> int:
+        pairs = Backend._mapping_from(key, value, mapping)
+
+        with self._lock:
+            h = self._hashes.setdefault(Backend._to_name(name), _MemoryHash())
+            return sum(h.set(k, v) for k, v in pairs.items())
+
+    def hdel(self, name, *keys) -> int:
+        with self._lock:
+            name = Backend._to_name(name)
+            h = self._hashes.get(name)
+            toret = 0
+
+            if h:
+                toret = sum(h.delete(Backend._to_bytes(k)) for k in keys)
+
+                if not h.data:
+                    del self._hashes[name]
+
+            return toret
+
+    def hlen(self, name) -> int:
+        h = self._hashes.get(Backend._to_name(name))
+        return len(h.data) if h else 0
+
+    def hincrby(self, name, key, amount: int=1) -> int:
+        with self._lock:
+            toret = int(self.hget(name, key) or 0) + amount
+            self.hset(name, key, toret)
+            return toret
+
+    def hscan(self, name, cursor: int=0, match=None, count=None,
+              no_values=None) -> tuple:
+        with self._lock:
+            h = self._hashes.get(Backend._to_name(name))
+
+            if not h:
+                return 0, ([] if no_values else {})
+
+            cursor, entries = h.scan(int(cursor), count or 10)
+
+        if no_values:
+            return cursor, [k for k, _ in entries]
+
+        return cursor, dict(entries)
+
+    def flushdb(self, *args, **kwargs) -> bool:
+        with self._lock:
+            self._hashes.clear()
+
+        return True
+
+
+class SQLiteBackend(Backend):
+    """Keeps all data in a SQLite database."""
+    def __init__(self, path: str=":memory:"):
+        """Opens (creating it if needed) the database.
+            :param path: The path of the database file.
+        """
+        super().__init__()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS hashes(
+                                name TEXT NOT NULL,
+                                field BLOB NOT NULL,
+                                value BLOB NOT NULL,
+                                UNIQUE(name, field))""")
+        self._db.execute("""CREATE INDEX IF NOT EXISTS hashes_by_name
+                                ON hashes(name)""")
+        self._in_transaction = False
+
+    def close(self):
+        self._db.close()
+
+    def __write(self, sql: str, params) -> int:
+        """Runs a statement, in its own transaction unless inside one."""
+        with self._lock:
+            if self._in_transaction:
+                return self._db.execute(sql, params).rowcount
+
+            with self._db:
+                return self._db.execute(sql, params).rowcount
+
+    def __executemany(self, sql: str, params: list) -> int:
+        with self._lock:
+            if self._in_transaction:
+                return self._db.executemany(sql, params).rowcount
+
+            with self._db:
+                return self._db.executemany(sql, params).rowcount
+
+    def _run_atomically(self, commands: list) -> list:
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._in_transaction = True
+
+            try:
+                toret = [getattr(self, name)(*args, **kwargs)
+                         for name, args, kwargs in commands]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            finally:
+                self._in_transaction = False
+
+            return toret
+
+    def hget(self, name, key) -> "bytes|None":
+        with self._lock:
+            row = self._db.execute(
+                        "SELECT value FROM hashes WHERE name=? AND field=?",
+                        (Backend._to_name(name),
+                         Backend._to_bytes(key))).fetchone()
+
+        return row[0] if row else None
+
+    def hmget(self, name, keys, *args) -> "list[bytes|None]":
+        name = Backend._to_name(name)
+        keys = Backend._keys_from(keys, args)
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._db.execute(
+                            "SELECT field, value FROM hashes WHERE name=?"
+                            " AND field IN (" + ",".join("?" * len(chunk))
+                            + ")",
+                            [name] + chunk)
+                found.update((bytes(f), v) for f, v in rows)
+
+        return [found.get(k) for k in keys]
+
+    def hset(self, name, key=None, value=None, mapping=None) -> int:
+        name = Backend._to_name(name)
+        pairs = Backend._mapping_from(key, value, mapping)
+
+        with self._lock:
+            toret = len(pairs) - self.__count_fields(name, list(pairs))
+            self.__executemany(
+                    "INSERT INTO hashes(name, field, value) VALUES(?, ?, ?)"
+                    " ON CONFLICT(name, field)"
+                    " DO UPDATE SET value=excluded.value",
+                    [(name, k, v) for k, v in pairs.items()])
+
+        return toret
+
+    def __count_fields(self, name: str, keys: "list[bytes]") -> int:
+        return sum(1 for v in self.hmget(name, keys) if v is not None)
+
+    def hdel(self, name, *keys) -> int:
+        name = Backend._to_name(name)
+
+        with self._lock:
+            toret = self.__count_fields(name, [Backend._to_bytes(k)
+                                               for k in keys])
+            self.__executemany(
+                    "DELETE FROM hashes WHERE name=? AND field=?",
+                    [(name, Backend._to_bytes(k)) for k in keys])
+
+        return toret
+
+    def hlen(self, name) -> int:
+        with self._lock:
+            return self._db.execute(
+                        "SELECT COUNT(*) FROM hashes WHERE name=?",
+                        (Backend._to_name(name),)).fetchone()[0]
+
+    def hincrby(self, name, key, amount: int=1) -> int:
+        with self._lock:
+            self.__write(
+                    "INSERT INTO hashes(name, field, value) VALUES(?, ?, ?)"
+                    " ON CONFLICT(name, field)"
+                    " DO UPDATE SET value=CAST(CAST(value AS INTEGER) + ?"
+                    " AS BLOB)",
+                    (Backend._to_name(name), Backend._to_bytes(key),
+                     Backend._to_bytes(amount), amount))
+            return int(self.hget(name, key))
+
+    def hscan(self, name, cursor: int=0, match=None, count=None,
+              no_values=None) -> tuple:
+        count = count or 10
+
+        with self._lock:
+            rows = self._db.execute(
+                        "SELECT rowid, field, value FROM hashes"
+                        " WHERE name=? AND rowid>? ORDER BY rowid LIMIT ?",
+                        (Backend._to_name(name), int(cursor),
+                         count + 1)).fetchall()
+
+        next_cursor = rows[count - 1][0] if len(rows) > count else 0
+        rows = rows[:count]
+
+        if no_values:
+            return next_cursor, [bytes(f) for _, f, _ in rows]
+
+        return next_cursor, {bytes(f): bytes(v) for _, f, v in rows}
+
+    def flushdb(self, *args, **kwargs) -> bool:
+        self.__write("DELETE FROM hashes", ())
+        return True
@@ -0,0 +1,166 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import redis
+
+from sirope.oid import OID
+
+
+class ChangeFeed:
+    """The change feed of a class: a Redis Stream with a record
+       per save or delete, holding the oid, the operation (save/delete),
+       the version of the object and, optionally, the changed fields.
+    """
+    STREAM_PREFIX = "__changes__:"
+    VERSIONS_PREFIX = "__versions__:"
+    SAVE = "save"
+    DELETE = "delete"
+
+    def __init__(self, ns: str, maxlen: int=10000, fields: bool=False):
+        """Creates the change feed for a namespace.
+            :param ns: The namespace (full name of the class).
+            :param maxlen: Approx. max. number of records kept.
+            :param fields: Whether to record the changed fields.
+        """
+        self._ns = ns
+        self._maxlen = maxlen
+        self._fields = fields
+
+    @property
+    def stream(self) -> str:
+        return ChangeFeed.STREAM_PREFIX + self._ns
+
+    @property
+    def versions(self) -> str:
+        return ChangeFeed.VERSIONS_PREFIX + self._ns
+
+    def spec(self, keys) -> dict:
+        """Returns the spec for the Lua scripts.
+            :param keys: The KeyList of the script call.
+        """
+        return {"stream": keys.index(self.stream),
+                "versions": keys.index(self.versions),
+                "maxlen": self._maxlen, "fields": self._fields}
+
+
+class Change:
+    """A record of the change feed."""
+    def __init__(self, id: str, oid: OID, op: str, version: int,
+                 fields: "list[str]|None"=None):
+        self._id = id
+        self._oid = oid
+        self._op = op
+        self._version = version
+        self._fields = fields
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def oid(self) -> OID:
+        return self._oid
+
+    @property
+    def op(self) -> str:
+        return self._op
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def fields(self) -> "list[str]|None":
+        return self._fields
+
+    @staticmethod
+    def from_record(id: "str|bytes", record: dict) -> "Change":
+        """Creates a Change from a record read from the stream."""
+        def txt(value):
+            if isinstance(value, bytes):
+                value = value.decode("utf-8", "replace")
+            return value
+
+        fields = None
+        if b"f" in record:
+            fields = [f for f in txt(record[b"f"]).split(",") if f]
+
+        return Change(txt(id),
+                      OID.from_text(txt(record[b"oid"])),
+                      txt(record[b"op"]),
+                      int(record[b"v"]),
+                      fields)
+
+    def __str__(self) -> str:
+        return f"{self.id}: {self.op} {self.oid} (v{self.version})"
+
+
+class ChangeConsumer:
+    """Tails the change feed of a class as a member of a consumer group.
+       The first poll returns the changes delivered to this consumer
+       but not acknowledged yet; later ones return new changes.
+    """
+    def __init__(self, sirope, cls: type, group: str, consumer: str,
+                 start_id: str="0"):
+        """Creates the consumer, and the group if it does not exist.
+            :param sirope: The Sirope object to load objects through.
+            :param cls: The class whose changes are consumed.
+            :param group: The name of the consumer group.
+            :param consumer: The name of this consumer in the group.
+            :param start_id: Where a new group starts ("$" for new changes).
+        """
+        self._sirope = sirope
+        self._redis = sirope._redis
+        self._stream = sirope._change_feed_for(cls).stream
+        self._group = group
+        self._consumer = consumer
+        self._pending_from = "0"
+
+        try:
+            self._redis.xgroup_create(self._stream, group, start_id,
+                                      mkstream=True)
+        except redis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def poll(self, count: int=100,
+             block: "int|None"=None) -> "list[tuple[Change, object|None]]":
+        """Returns the next changes, along with the affected objects,
+           loaded in a batch (None for deleted objects).
+            :param count: Max. number of changes.
+            :param block: Millisecs. to wait for changes, or None.
+        """
+        changes = []
+        recovering = self._pending_from is not None
+        entries = self._redis.xreadgroup(
+                                self._group, self._consumer,
+                                {self._stream: self._pending_from or ">"},
+                                count=count,
+                                block=None if recovering else block)
+
+        for _, records in entries or []:
+            for id, record in records:
+                if record:
+                    changes.append(Change.from_record(id, record))
+
+        if recovering:
+            if not changes:
+                self._pending_from = None
+                return self.poll(count, block)
+
+            self._pending_from = changes[-1].id
+
+        saved = [c.oid for c in changes if c.op == ChangeFeed.SAVE]
+        objs = dict(zip(saved,
+                        self._sirope.multi_load_ordered(saved)))
+        return [(c, objs.get(c.oid)) for c in changes]
+
+    def ack(self, changes: "list[Change]") -> int:
+        """Acknowledges these changes as processed."""
+        toret = 0
+
+        if changes:
+            toret = self._redis.xack(self._stream, self._group,
+                                     *[c.id for c in changes])
+
+        return toret
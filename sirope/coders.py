@@ -67,23 +67,40 @@ class JSONDCoder(json.JSONDecoder):
     def bytes_from_dict(d: dict) -> bytes:
         return base64.b64decode(d["d"].encode())
 
+    @staticmethod
+    def datetime_from_dict(d: dict) -> datetime.datetime:
+        return datetime.datetime(d["y"], d["month"], d["d"],
+                                 d["h"], d["minute"], d["s"], d["ms"])
+
     @staticmethod
     def from_dict(d: dict) -> object:
         cls_name = d.get(Transcoder.CLASS_ID)
+        from_dict = JSONDCoder.FROM_DICT.get(cls_name) if cls_name else None
 
-        if cls_name == full_name_from_obj(datetime.datetime):
-            dt = JSONDCoder.date_from_dict(d)
-            tm = JSONDCoder.time_from_dict(d)
-            return datetime.datetime(dt.year, dt.month, dt.day,
-                                     tm.hour, tm.minute, tm.second,
-                                     tm.microsecond)
-        elif cls_name == full_name_from_obj(OID):
-            return OID.from_dict(d)
-        elif cls_name == full_name_from_obj(datetime.date):
-            return JSONDCoder.date_from_dict(d)
-        elif cls_name == full_name_from_obj(datetime.time):
-            return JSONDCoder.time_from_dict(d)
-        elif cls_name == Transcoder.BYTES_ID:
-            return JSONDCoder.bytes_from_dict(d)
-
-        return d
+        return from_dict(d) if from_dict else d
+
+    @staticmethod
+    def convert(value: object) -> object:
+        """Converts the dicts inside an already decoded value,
+           as the object hook would have done while decoding.
+        """
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if isinstance(v, (dict, list)):
+                    value[k] = JSONDCoder.convert(v)
+
+            value = JSONDCoder.from_dict(value)
+        elif isinstance(value, list):
+            for i, v in enumerate(value):
+                if isinstance(v, (dict, list)):
+                    value[i] = JSONDCoder.convert(v)
+
+        return value
+
+
+JSONDCoder.FROM_DICT = {
+    full_name_from_obj(datetime.datetime): JSONDCoder.datetime_from_dict,
+    full_name_from_obj(OID): OID.from_dict,
+    full_name_from_obj(datetime.date): JSONDCoder.date_from_dict,
+    full_name_from_obj(datetime.time): JSONDCoder.time_from_dict,
+    Transcoder.BYTES_ID: JSONDCoder.bytes_from_dict}
@@ -0,0 +1,263 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import json
+import array
+import datetime
+import base64
+import importlib.util
+
+from sirope.oid import OID
+from sirope.coders import Transcoder
+from sirope.utils import full_name_from_obj
+
+
+class Column:
+    """A column of values of a field, kept in a typed buffer.
+       Dates, times and datetimes are stored as integers
+       (days since the epoch, and microsecs. since midnight or the epoch).
+       Values of different types, other than ints and floats,
+       turn the column into a column of Python objects, which become
+       JSON strings in pyarrow if they are not all of the same type.
+    """
+    INT = "int"
+    FLOAT = "float"
+    BOOL = "bool"
+    STR = "str"
+    DATETIME = "datetime"
+    DATE = "date"
+    TIME = "time"
+    OBJECT = "object"
+
+    TYPECODES = {INT: "q", FLOAT: "d", BOOL: "b",
+                 DATETIME: "q", DATE: "q", TIME: "q"}
+
+    DATETIME_ID = full_name_from_obj(datetime.datetime)
+    DATE_ID = full_name_from_obj(datetime.date)
+    TIME_ID = full_name_from_obj(datetime.time)
+    OID_ID = full_name_from_obj(OID)
+    EPOCH = datetime.datetime(1970, 1, 1)
+    US_PER_DAY = 86400 * 1000000
+
+    def __init__(self, name: str):
+        self._name = name
+        self._kind = None
+        self._values = []
+        self._mask = bytearray()
+        self._nulls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def kind(self) -> "str|None":
+        return self._kind
+
+    def __len__(self) -> int:
+        return len(self._mask)
+
+    def append(self, json_value: object):
+        """Appends a value, as decoded from JSON without the object hook."""
+        if json_value is None:
+            self._mask.append(1)
+            self._nulls += 1
+            self._values.append(None if self._kind in (None, Column.STR,
+                                                       Column.OBJECT)
+                                     else 0)
+            return
+
+        kind, value = Column.__convert(json_value)
+
+        if kind != self._kind:
+            if self._kind is None:
+                self.__start(kind)
+            elif self._kind == Column.INT and kind == Column.FLOAT:
+                self._values = array.array("d", self._values)
+                self._kind = Column.FLOAT
+            elif self._kind == Column.FLOAT and kind == Column.INT:
+                value = float(value)
+            elif self._kind != Column.OBJECT:
+                self.__to_objects()
+
+        if self._kind == Column.OBJECT:
+            value = Column.__to_object(kind, value)
+
+        self._mask.append(0)
+        self._values.append(value)
+
+    def __start(self, kind: str):
+        self._kind = kind
+        typecode = Column.TYPECODES.get(kind)
+
+        if typecode:
+            self._values = array.array(typecode, [0] * len(self._values))
+
+    def __to_objects(self):
+        kind = self._kind
+        self._kind = Column.OBJECT
+        self._values = [None if null else Column.__to_object(kind, v)
+                        for v, null in zip(self._values, self._mask)]
+
+    @staticmethod
+    def __to_object(kind: str, value: object) -> object:
+        if kind == Column.DATETIME:
+            return Column.EPOCH + datetime.timedelta(microseconds=value)
+        elif kind == Column.DATE:
+            return Column.EPOCH.date() + datetime.timedelta(days=value)
+        elif kind == Column.TIME:
+            return (Column.EPOCH
+                    + datetime.timedelta(microseconds=value)).time()
+        elif kind == Column.BOOL:
+            return bool(value)
+
+        return value
+
+    @staticmethod
+    def __days(y: int, m: int, d: int) -> int:
+        """Days since 1970-01-01 of a date of the proleptic calendar."""
+        y -= m <= 2
+        era = y // 400
+        yoe = y - era * 400
+        doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+        doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+        return era * 146097 + doe - 719468
+
+    @staticmethod
+    def __convert(json_value: object) -> "tuple[str, object]":
+        if isinstance(json_value, bool):
+            return Column.BOOL, json_value
+        elif isinstance(json_value, int):
+            return Column.INT, json_value
+        elif isinstance(json_value, float):
+            return Column.FLOAT, json_value
+        elif isinstance(json_value, str):
+            return Column.STR, json_value
+        elif isinstance(json_value, dict):
+            cls_name = json_value.get(Transcoder.CLASS_ID)
+
+            if cls_name == Column.DATETIME_ID:
+                return (Column.DATETIME,
+                        Column.__days(json_value["y"], json_value["month"],
+                                      json_value["d"]) * Column.US_PER_DAY
+                        + Column.__time_us(json_value))
+            elif cls_name == Column.DATE_ID:
+                return (Column.DATE,
+                        Column.__days(json_value["y"], json_value["month"],
+                                      json_value["d"]))
+            elif cls_name == Column.TIME_ID:
+                return Column.TIME, Column.__time_us(json_value)
+            elif cls_name == Column.OID_ID:
+                return Column.STR, json_value["_ns"] + "@" + str(
+                                                        json_value["_num"])
+            elif cls_name == Transcoder.BYTES_ID:
+                return Column.OBJECT, base64.b64decode(json_value["d"])
+
+        return Column.OBJECT, json_value
+
+    @staticmethod
+    def __time_us(d: dict) -> int:
+        return ((d["h"] * 60 + d["minute"]) * 60 + d["s"]) * 1000000 + d["ms"]
+
+    def to_numpy(self):
+        """Returns the column as a numpy array,
+           or a masked array if there are nulls.
+        """
+        import numpy
+
+        dtypes = {Column.INT: "int64", Column.FLOAT: "float64",
+                  Column.BOOL: "bool", Column.DATETIME: "datetime64[us]",
+                  Column.DATE: "datetime64[D]", Column.TIME: "timedelta64[us]"}
+        dtype = dtypes.get(self._kind)
+
+        if dtype:
+            toret = numpy.frombuffer(self._values,
+                                     dtype=self._values.typecode
+                                     ).astype(dtype)
+        else:
+            toret = numpy.empty(len(self._values), dtype=object)
+            toret[:] = self._values
+
+        if self._nulls:
+            toret = numpy.ma.masked_array(toret,
+                                          mask=numpy.frombuffer(self._mask,
+                                                                dtype=bool))
+
+        return toret
+
+    def to_arrow(self):
+        """Returns the column as a pyarrow array.
+           Objects of different types, or that pyarrow cannot convert,
+           are stored as their JSON.
+        """
+        import numpy
+        import pyarrow
+
+        types = {Column.INT: pyarrow.int64(), Column.FLOAT: pyarrow.float64(),
+                 Column.BOOL: pyarrow.bool_(),
+                 Column.DATETIME: pyarrow.timestamp("us"),
+                 Column.DATE: pyarrow.date32(),
+                 Column.TIME: pyarrow.time64("us"),
+                 Column.STR: pyarrow.string()}
+        arrow_type = types.get(self._kind)
+        mask = (numpy.frombuffer(self._mask, dtype=bool)
+                if self._nulls else None)
+
+        if arrow_type is None:
+            if len({type(v) for v in self._values if v is not None}) <= 1:
+                try:
+                    return pyarrow.array(self._values, from_pandas=True)
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                    pass
+
+            return pyarrow.array([None if v is None
+                                       else json.dumps(v, default=str)
+                                  for v in self._values],
+                                 type=pyarrow.string())
+
+        if self._kind == Column.STR:
+            return pyarrow.array(self._values, type=arrow_type)
+
+        values = numpy.frombuffer(self._values, dtype=self._values.typecode)
+        if self._kind == Column.BOOL:
+            values = values.astype(bool)
+        elif self._kind == Column.DATE:
+            values = values.astype("int32")
+
+        return pyarrow.array(values, type=arrow_type, mask=mask)
+
+
+def to_columns(sirope, ns: str, fields: "list[str]",
+               where: "dict|None"=None, chunk_size: int=500,
+               arrow: "bool|None"=None):
+    """Extracts fields of the objects of a namespace into columns,
+       decoding the objects in chunks, with no object hook.
+        :param sirope: The Sirope object to read from.
+        :param ns: The namespace (full name of the class).
+        :param fields: The names of the fields.
+        :param where: Values (str, number, bool) fields must equal.
+        :param chunk_size: Number of objects per chunk.
+        :param arrow: True for a pyarrow Table, False for a dict of
+                      numpy arrays, None for pyarrow if available.
+    """
+    if arrow is None:
+        arrow = importlib.util.find_spec("pyarrow") is not None
+
+    columns = [Column(field) for field in fields]
+    where = list((where or {}).items())
+    decoder = json.JSONDecoder()
+
+    for _, json_obj in sirope._reader(ns).hscan_iter(ns, count=chunk_size):
+        obj_dict = decoder.decode(json_obj.decode("utf-8", "replace"))
+
+        if all(obj_dict.get(k) == v for k, v in where):
+            for column in columns:
+                column.append(obj_dict.get(column.name))
+
+    if arrow:
+        import pyarrow
+
+        return pyarrow.Table.from_arrays([c.to_arrow() for c in columns],
+                                         names=list(fields))
+
+    return {c.name: c.to_numpy() for c in columns}
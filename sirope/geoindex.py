@@ -0,0 +1,49 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+class GeoIndex:
+    """A geospatial index of the objects of a class, with their
+       coordinates in a Redis geo set (a sorted set) of nums.
+       Objects with no valid coordinates are not indexed.
+    """
+    PREFIX = "__geo__:"
+    MAX_LAT = 85.05112878
+    MAX_LON = 180.0
+
+    def __init__(self, ns: str, lat_field: str, lon_field: str):
+        self._ns = ns
+        self._lat_field = lat_field
+        self._lon_field = lon_field
+
+    @property
+    def lat_field(self) -> str:
+        return self._lat_field
+
+    @property
+    def lon_field(self) -> str:
+        return self._lon_field
+
+    @property
+    def key(self) -> str:
+        return GeoIndex.PREFIX + self._ns
+
+    def coords_for(self, obj_dict: dict) -> "list[float]|bool":
+        """Returns [lon, lat] for the Lua scripts, or False if the object
+           is not to be indexed.
+            :param obj_dict: The JSON of the object, decoded with no hook.
+        """
+        lat = obj_dict.get(self._lat_field)
+        lon = obj_dict.get(self._lon_field)
+
+        if not GeoIndex.is_valid(lat, lon):
+            return False
+
+        return [lon, lat]
+
+    @staticmethod
+    def is_valid(lat: object, lon: object) -> bool:
+        """Determines whether these coordinates can be indexed."""
+        return (all(isinstance(x, (int, float)) and not isinstance(x, bool)
+                    for x in (lat, lon))
+                and abs(lat) <= GeoIndex.MAX_LAT
+                and abs(lon) <= GeoIndex.MAX_LON)
@@ -0,0 +1,194 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import json
+import typing
+
+from sirope.coders import JSONCoder
+from sirope.coders import JSONDCoder
+from sirope.coders import Transcoder
+from sirope.utils import cls_from_str
+from sirope.utils import full_name_from_obj
+
+
+class ClassCodec:
+    """Encodes and decodes the objects of a given class.
+       When some declared fields are plain (str, int, float, bool),
+       the JSON is decoded without the object hook, and only the values
+       of the other fields are converted. Objects of classes using __slots__
+       are supported, provided "__oid__" is a slot.
+    """
+    OID_ID = "__oid__"
+    PLAIN_TYPES = (str, int, float, bool)
+
+    _encoder = JSONCoder()
+    _decoder = JSONDCoder()
+    _plain_decoder = json.JSONDecoder()
+
+    def __init__(self, cls: type, fields: "dict[str, type]|None"=None):
+        """Creates the codec for a class.
+            :param cls: The class.
+            :param fields: Types of the fields, by attribute name,
+                           or None to take the class annotations.
+        """
+        self._cls = cls
+        self._ns = full_name_from_obj(cls)
+        self._slots = ClassCodec.__slots_of(cls)
+        self._has_dict = hasattr(object.__new__(cls), "__dict__")
+
+        if not self._has_dict and ClassCodec.OID_ID not in self._slots:
+            raise TypeError(self._ns + ": '" + ClassCodec.OID_ID
+                            + "' must be declared in __slots__")
+
+        if fields is None:
+            try:
+                fields = typing.get_type_hints(cls)
+            except Exception:
+                fields = getattr(cls, "__annotations__", {})
+
+        self._plain_fields = frozenset(
+                                name for name, tp in fields.items()
+                                if tp in ClassCodec.PLAIN_TYPES)
+        self._plain_decode = bool(self._plain_fields)
+
+    @property
+    def cls(self) -> type:
+        return self._cls
+
+    @property
+    def namespace(self) -> str:
+        return self._ns
+
+    def get_oid(self, obj: object):
+        """Returns the OID of this object, or None."""
+        if self._slots:
+            return getattr(obj, ClassCodec.OID_ID, None)
+
+        return obj.__dict__.get(ClassCodec.OID_ID)
+
+    def set_oid(self, obj: object, oid):
+        """Stores the OID inside this object."""
+        slot = self._slots.get(ClassCodec.OID_ID)
+
+        if slot:
+            slot.__set__(obj, oid)
+        else:
+            obj.__dict__[ClassCodec.OID_ID] = oid
+
+    def to_dict(self, obj: object) -> dict:
+        """Returns the attributes of this object as a dict."""
+        if not self._slots:
+            return obj.__dict__
+
+        toret = {}
+        for name, slot in self._slots.items():
+            try:
+                toret[name] = slot.__get__(obj, self._cls)
+            except AttributeError:
+                pass
+
+        if self._has_dict:
+            toret.update(obj.__dict__)
+
+        return toret
+
+    def encode(self, obj: object) -> str:
+        """Returns the JSON for this object."""
+        return ClassCodec._encoder.encode(self.to_dict(obj))
+
+    def decode(self, json_txt: "str|bytes") -> object:
+        """Returns the object for this JSON."""
+        if isinstance(json_txt, bytes):
+            json_txt = json_txt.decode("utf-8", "replace")
+
+        if self._plain_decode:
+            obj_dict = ClassCodec._plain_decoder.decode(json_txt)
+
+            for name, value in obj_dict.items():
+                if (isinstance(value, (dict, list))
+                and name not in self._plain_fields):
+                    obj_dict[name] = JSONDCoder.convert(value)
+        else:
+            obj_dict = ClassCodec._decoder.decode(json_txt)
+
+        obj_dict.pop(Transcoder.CLASS_ID, None)
+
+        toret: object = object.__new__(self._cls)
+
+        if not self._slots:
+            toret.__dict__ = obj_dict
+        else:
+            for name, value in obj_dict.items():
+                slot = self._slots.get(name)
+
+                if slot:
+                    slot.__set__(toret, value)
+                elif self._has_dict:
+                    toret.__dict__[name] = value
+
+        return toret
+
+    @staticmethod
+    def __slots_of(cls: type) -> dict:
+        """Returns the slot descriptors of this class, by name."""
+        toret = {}
+
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+
+            if isinstance(slots, str):
+                slots = (slots,)
+
+            for name in slots:
+                if name in ("__dict__", "__weakref__"):
+                    continue
+
+                attr_name = name
+                if name.startswith("__") and not name.endswith("__"):
+                    attr_name = "_" + klass.__name__.lstrip("_") + name
+
+                toret[attr_name] = klass.__dict__[attr_name]
+
+        return toret
+
+
+_codecs: "dict[type, ClassCodec]" = {}
+_codecs_by_ns: "dict[str, ClassCodec]" = {}
+
+
+def register(cls: type, fields: "dict[str, type]|None"=None) -> ClassCodec:
+    """Registers a class, building its codec.
+        :param cls: The class to register.
+        :param fields: Types of the fields, by attribute name,
+                       or None to take the class annotations.
+        :return: The codec for the class.
+    """
+    toret = ClassCodec(cls, fields)
+    _codecs[cls] = toret
+    _codecs_by_ns[toret.namespace] = toret
+    return toret
+
+
+def codec_for(cls: type) -> ClassCodec:
+    """Returns the codec for this class, registering it if needed."""
+    toret = _codecs.get(cls)
+
+    if not toret:
+        toret = register(cls)
+
+    return toret
+
+
+def codec_for_ns(ns: str) -> ClassCodec:
+    """Returns the codec for the class with this full name."""
+    toret = _codecs_by_ns.get(ns)
+
+    if not toret:
+        cls = cls_from_str(ns)
+
+        if not cls:
+            raise NameError(ns)
+
+        toret = register(cls)
+
+    return toret
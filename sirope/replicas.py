@@ -0,0 +1,125 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import time
+import itertools
+import threading
+
+
+class ReplicaSet:
+    """Routes reads to replicas and writes to the primary."""
+    ROUND_ROBIN = "round_robin"
+    LEAST_LATENCY = "least_latency"
+    POLICIES = (ROUND_ROBIN, LEAST_LATENCY)
+
+    def __init__(self, primary, replicas: "list|None"=None,
+                 policy: str=ROUND_ROBIN,
+                 read_your_writes: float=0.0,
+                 probe_interval: float=5.0):
+        """Creates a replica set.
+            :param primary: The Redis object all writes go to.
+            :param replicas: A list of Redis objects for reads, or None.
+            :param policy: Either ROUND_ROBIN or LEAST_LATENCY.
+            :param read_your_writes: Seconds after a write in which reads
+                                     of that namespace stay on the primary.
+            :param probe_interval: Seconds between latency probes.
+        """
+        if policy not in ReplicaSet.POLICIES:
+            raise ValueError("invalid read policy: " + str(policy))
+
+        self._primary = primary
+        self._replicas = list(replicas or [])
+        self._policy = policy
+        self._read_your_writes = max(0.0, float(read_your_writes))
+        self._probe_interval = probe_interval
+        self._next_replica = itertools.cycle(self._replicas)
+        self._latencies = [0.0] * len(self._replicas)
+        self._last_probe = None
+        self._last_writes: "dict[str, float]" = {}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self._primary
+
+    @property
+    def replicas(self) -> list:
+        return list(self._replicas)
+
+    def server(self, index: int):
+        """Returns the Redis object with this index,
+           0 being the primary and 1.. the replicas.
+        """
+        if not 0 <= index <= len(self._replicas):
+            raise ValueError("invalid server index: " + str(index))
+
+        return self._replicas[index - 1] if index else self._primary
+
+    def index_of(self, server) -> int:
+        """Returns the index of this Redis object, as used by server()."""
+        for i, replica in enumerate(self._replicas):
+            if replica is server:
+                return i + 1
+
+        return 0
+
+    def wrote(self, ns: str):
+        """Records a write on this namespace, for read-your-writes."""
+        if self._read_your_writes > 0:
+            self._last_writes[ns] = time.monotonic()
+
+    def for_read(self, ns: "str|None"=None):
+        """Returns the Redis object a read on this namespace should use."""
+        toret = self._primary
+
+        if self._replicas and not self.__in_write_window(ns):
+            if self._policy == ReplicaSet.LEAST_LATENCY:
+                toret = self.__fastest()
+            else:
+                with self._lock:
+                    toret = next(self._next_replica)
+
+        return toret
+
+    def __in_write_window(self, ns: "str|None") -> bool:
+        toret = False
+
+        if self._read_your_writes > 0:
+            if ns is None:
+                last = max(self._last_writes.values(), default=None)
+            else:
+                last = self._last_writes.get(ns)
+
+            toret = (last is not None
+                     and time.monotonic() - last < self._read_your_writes)
+
+        return toret
+
+    def __fastest(self):
+        now = time.monotonic()
+
+        if (self._last_probe is None
+         or now - self._last_probe >= self._probe_interval):
+            with self._lock:
+                self._last_probe = now
+                self.probe()
+
+        toret = self._primary
+        best = float("inf")
+        for replica, latency in zip(self._replicas, self._latencies):
+            if latency < best:
+                best = latency
+                toret = replica
+
+        return toret
+
+    def probe(self):
+        """Measures the round trip time of each replica with a PING."""
+        for i, replica in enumerate(self._replicas):
+            start = time.perf_counter()
+
+            try:
+                replica.ping()
+                self._latencies[i] = time.perf_counter() - start
+            except Exception:
+                self._latencies[i] = float("inf")
@@ -66,6 +66,31 @@ class SafeIndex:
             self._redis.hdel(SafeIndex.OIDS_INDEXES_STORE_NAME,
                              str(oid))
 
+    def read_for(self, pipe, oids: "list[OID]") -> "list[str]":
+        """Reads the safe oids associated to these OIDs in a single
+           round trip, through a pipeline watching OIDS_INDEXES_STORE_NAME
+           and not yet in MULTI mode, so they cannot change until
+           the deletion is executed.
+        """
+        toret = []
+
+        if oids:
+            bsoids = pipe.hmget(SafeIndex.OIDS_INDEXES_STORE_NAME,
+                                *[str(oid) for oid in oids])
+            toret = [bsoid.decode("utf-8", "replace")
+                     for bsoid in bsoids if bsoid]
+
+        return toret
+
+    def queue_delete_for(self, pipe, oids: "list[OID]", soids: "list[str]"):
+        """Queues the deletion of the safe oids associated to these OIDs,
+           as returned by read_for(), in the given pipeline.
+        """
+        if soids:
+            pipe.hdel(SafeIndex.INDEXES_OIDS_STORE_NAME, *soids)
+            pipe.hdel(SafeIndex.OIDS_INDEXES_STORE_NAME,
+                      *[str(oid) for oid in oids])
+
     def __len__(self):
         return self._redis.hlen(SafeIndex.INDEXES_OIDS_STORE_NAME)
 
@@ -75,7 +100,7 @@ class SafeIndex:
 
     @staticmethod
     def get(redis):
-        if not SafeIndex.instance:
+        if not SafeIndex.instance or SafeIndex.instance._redis is not redis:
             SafeIndex.instance = SafeIndex(redis)
 
         return SafeIndex.instance
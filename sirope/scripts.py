@@ -0,0 +1,431 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+# Lua scripts writing objects along with the data maintained for
+# their class (change feeds, unique fields, expiry...), atomically.
+# ARGV[1] is a JSON spec built by Sirope, which refers to the keys
+# the script accesses by their index in KEYS.
+
+
+class KeyList:
+    """The names of the keys accessed by a script, to be passed in KEYS,
+       each one having a (1-based) index.
+    """
+    def __init__(self):
+        self._names: "list[str]" = []
+        self._indexes: "dict[str, int]" = {}
+
+    @property
+    def names(self) -> "list[str]":
+        return self._names
+
+    def index(self, name: str) -> int:
+        """Returns the index of this key, adding it if needed."""
+        toret = self._indexes.get(name)
+
+        if toret is None:
+            self._names.append(name)
+            toret = len(self._names)
+            self._indexes[name] = toret
+
+        return toret
+
+
+# Error returned when the tokens of a text index read by the client
+# changed before the script ran, so the write must be retried.
+STALE = "STALE"
+
+
+# spec.nss: the data maintained for each namespace written:
+#   key: the hash of the namespace.
+#   feed: {stream, versions, maxlen, fields}, or false.
+#   uniques: [field, index, rev_index] for unique fields.
+#   texts: [field, rev_index] for text indexes.
+#   geo: the geo index, or false.
+#   expiry: {key, native}: the expiry sorted set (scores are deadlines
+#           in ms), and whether HPEXPIRE is available, or false.
+# spec.saves: the objects to save, whose JSON is in ARGV[2], ARGV[3]...
+#   {ns, num, ttl: in ms or false to remove the expiry,
+#    uniques: the key of each unique field, or false,
+#    texts: {old, old_keys, tokens, keys} for each text index:
+#           the tokens (a string) read by the client, or false,
+#           the keys of their sets, and the same for the new tokens,
+#    geo: [lon, lat], or false to remove the object from the index}
+# spec.deletes: the objects to delete: {ns, num, texts: {old, old_keys}}
+# spec.sweep: if true, only objects whose deadline has passed are deleted,
+#             and their data is removed even if they already expired.
+# spec.safe: the hashes of the safe indexes.
+# The unique fields of all saves are checked before writing anything.
+# Returns the number of deleted objects.
+WRITE = """
+local spec = cjson.decode(ARGV[1])
+local nss = spec.nss
+local safe = spec.safe
+local now = nil
+local deleted = {}
+local new_keys = {}
+local claims = {}
+local num_deleted = 0
+
+local function check_texts(obj)
+    for i, text in ipairs(nss[obj.ns].texts) do
+        if redis.call('HGET', KEYS[text[2]], obj.num) ~= obj.texts[i].old then
+            return false
+        end
+    end
+
+    return true
+end
+
+if spec.sweep then
+    now = redis.call('TIME')
+    now = now[1] * 1000 + math.floor(now[2] / 1000)
+end
+
+for _, obj in ipairs(spec.deletes) do
+    deleted[obj.ns .. '@' .. obj.num] = true
+
+    if not check_texts(obj) then
+        return redis.error_reply('STALE')
+    end
+end
+
+for _, save in ipairs(spec.saves) do
+    if not check_texts(save) then
+        return redis.error_reply('STALE')
+    end
+
+    for i, unique in ipairs(nss[save.ns].uniques) do
+        new_keys[unique[2] .. '@' .. save.num] = save.uniques[i]
+    end
+end
+
+-- An owner is free if deleted, or saved with another value, in this batch,
+-- or if it no longer exists (it expired, or was deleted by a Sirope object
+-- not maintaining the index)
+local function is_free(ns, index, owner, key)
+    local new_key = new_keys[index .. '@' .. owner]
+
+    return deleted[ns .. '@' .. owner]
+        or (new_key ~= nil and new_key ~= key)
+        or redis.call('HEXISTS', KEYS[nss[ns].key], owner) == 0
+end
+
+for _, save in ipairs(spec.saves) do
+    for i, unique in ipairs(nss[save.ns].uniques) do
+        local key = save.uniques[i]
+
+        if key then
+            local claim = unique[2] .. '@' .. key
+            local owner = claims[claim]
+
+            if not owner then
+                owner = redis.call('HGET', KEYS[unique[2]], key)
+
+                if owner and is_free(save.ns, unique[2], owner, key) then
+                    owner = nil
+                end
+            end
+
+            if owner and owner ~= save.num then
+                return redis.error_reply('UNIQUE ' .. save.ns .. ' '
+                                         .. unique[1])
+            end
+
+            claims[claim] = save.num
+        end
+    end
+end
+
+local function delete_obj(obj)
+    local ns = obj.ns
+    local num = obj.num
+    local info = nss[ns]
+    local toid = ns .. '@' .. num
+    local due = true
+    local toret = 0
+
+    if info.expiry then
+        local expiry_key = KEYS[info.expiry.key]
+
+        if spec.sweep then
+            local deadline = redis.call('ZSCORE', expiry_key, num)
+            due = deadline and tonumber(deadline) <= now
+
+            -- Saved again with no ttl by a Sirope object unaware of it
+            if due and info.expiry.native
+            and redis.call('HPTTL', KEYS[info.key],
+                           'FIELDS', 1, num)[1] == -1 then
+                redis.call('ZREM', expiry_key, num)
+                due = false
+            end
+        end
+
+        if due then
+            redis.call('ZREM', expiry_key, num)
+        end
+    end
+
+    if due and (redis.call('HDEL', KEYS[info.key], num) > 0
+                or spec.sweep) then
+        toret = 1
+
+        for _, unique in ipairs(info.uniques) do
+            local old_key = redis.call('HGET', KEYS[unique[3]], num)
+            if old_key then
+                if redis.call('HGET', KEYS[unique[2]], old_key) == num then
+                    redis.call('HDEL', KEYS[unique[2]], old_key)
+                end
+                redis.call('HDEL', KEYS[unique[3]], num)
+            end
+        end
+
+        for i, text in ipairs(info.texts) do
+            local tokens = obj.texts[i]
+            if tokens.old then
+                for _, key in ipairs(tokens.old_keys) do
+                    redis.call('SREM', KEYS[key], num)
+                end
+                redis.call('HDEL', KEYS[text[2]], num)
+            end
+        end
+
+        if info.geo then
+            redis.call('ZREM', KEYS[info.geo], num)
+        end
+
+        local feed = info.feed
+        if feed then
+            local versions = KEYS[feed.versions]
+            local version = redis.call('HINCRBY', versions, num, 1)
+            redis.call('XADD', KEYS[feed.stream],
+                       'MAXLEN', '~', feed.maxlen, '*',
+                       'oid', toid, 'op', 'delete', 'v', version)
+            redis.call('HDEL', versions, num)
+        end
+    end
+
+    local soid = due and redis.call('HGET', KEYS[safe[2]], toid)
+    if soid then
+        redis.call('HDEL', KEYS[safe[1]], soid)
+        redis.call('HDEL', KEYS[safe[2]], toid)
+    end
+
+    return toret
+end
+
+local function save_obj(save, json)
+    local ns = save.ns
+    local num = save.num
+    local info = nss[ns]
+    local ns_key = KEYS[info.key]
+    local feed = info.feed
+    local old = nil
+
+    for i, unique in ipairs(info.uniques) do
+        local index = KEYS[unique[2]]
+        local rev_index = KEYS[unique[3]]
+        local key = save.uniques[i]
+        local old_key = redis.call('HGET', rev_index, num)
+
+        if old_key and old_key ~= key
+        and redis.call('HGET', index, old_key) == num then
+            redis.call('HDEL', index, old_key)
+        end
+
+        if key then
+            local owner = redis.call('HGET', index, key)
+
+            -- Reclaim the value from a missing owner
+            if owner and owner ~= num
+            and redis.call('HGET', rev_index, owner) == key then
+                redis.call('HDEL', rev_index, owner)
+            end
+
+            redis.call('HSET', index, key, num)
+            redis.call('HSET', rev_index, num, key)
+        elseif old_key then
+            redis.call('HDEL', rev_index, num)
+        end
+    end
+
+    for i, text in ipairs(info.texts) do
+        local tokens = save.texts[i]
+        local is_new = {}
+
+        for _, key in ipairs(tokens.keys) do
+            is_new[key] = true
+        end
+
+        for _, key in ipairs(tokens.old_keys) do
+            if is_new[key] then
+                is_new[key] = false
+            else
+                redis.call('SREM', KEYS[key], num)
+            end
+        end
+
+        for key, add in pairs(is_new) do
+            if add then
+                redis.call('SADD', KEYS[key], num)
+            end
+        end
+
+        if tokens.tokens ~= '' then
+            redis.call('HSET', KEYS[text[2]], num, tokens.tokens)
+        elseif tokens.old then
+            redis.call('HDEL', KEYS[text[2]], num)
+        end
+    end
+
+    if info.geo then
+        if save.geo then
+            redis.call('GEOADD', KEYS[info.geo], save.geo[1], save.geo[2],
+                       num)
+        else
+            redis.call('ZREM', KEYS[info.geo], num)
+        end
+    end
+
+    if feed and feed.fields then
+        old = redis.call('HGET', ns_key, num)
+    end
+
+    redis.call('HSET', ns_key, num, json)
+
+    if feed then
+        local version = redis.call('HINCRBY', KEYS[feed.versions], num, 1)
+        local record = {'oid', ns .. '@' .. num, 'op', 'save', 'v', version}
+
+        if feed.fields then
+            local new_obj = cjson.decode(json)
+            local old_obj = {}
+            local changed = {}
+
+            if old then
+                old_obj = cjson.decode(old)
+            end
+
+            for k, v in pairs(new_obj) do
+                if old_obj[k] == nil
+                or cjson.encode(old_obj[k]) ~= cjson.encode(v) then
+                    table.insert(changed, k)
+                end
+            end
+
+            for k, _ in pairs(old_obj) do
+                if new_obj[k] == nil then
+                    table.insert(changed, k)
+                end
+            end
+
+            table.sort(changed)
+            table.insert(record, 'f')
+            table.insert(record, table.concat(changed, ','))
+        end
+
+        redis.call('XADD', KEYS[feed.stream], 'MAXLEN', '~', feed.maxlen,
+                   '*', unpack(record))
+    end
+
+    local expiry = info.expiry
+    if expiry then
+        if save.ttl then
+            local time = redis.call('TIME')
+            local deadline = time[1] * 1000 + math.floor(time[2] / 1000)
+                             + save.ttl
+
+            redis.call('ZADD', KEYS[expiry.key], deadline, num)
+            if expiry.native then
+                redis.call('HPEXPIRE', ns_key, save.ttl, 'FIELDS', 1, num)
+            end
+        else
+            redis.call('ZREM', KEYS[expiry.key], num)
+            if expiry.native then
+                redis.call('HPERSIST', ns_key, 'FIELDS', 1, num)
+            end
+        end
+    end
+end
+
+for _, obj in ipairs(spec.deletes) do
+    num_deleted = num_deleted + delete_obj(obj)
+end
+
+for i, save in ipairs(spec.saves) do
+    save_obj(save, ARGV[i + 1])
+end
+
+return num_deleted
+"""
+
+
+# KEYS[1]: the hash of the namespace.
+# spec.cursor, spec.count: the HSCAN cursor and count for this chunk.
+# spec.group_by: the field to group by, or false.
+# spec.fields: the fields to compute count/sum/min/max for.
+# spec.where: values fields must be equal to.
+# Returns {cursor, groups}, with groups keyed by the JSON of their value.
+AGGREGATE = """
+local spec = cjson.decode(ARGV[1])
+local res = redis.call('HSCAN', KEYS[1], spec.cursor, 'COUNT', spec.count)
+local entries = res[2]
+local groups = {}
+
+for i = 2, #entries, 2 do
+    local obj = cjson.decode(entries[i])
+    local matches = true
+
+    for k, v in pairs(spec.where) do
+        if obj[k] ~= v then
+            matches = false
+            break
+        end
+    end
+
+    if matches then
+        local key = 'null'
+        if spec.group_by then
+            local value = obj[spec.group_by]
+            if value ~= nil then
+                key = cjson.encode(value)
+            end
+        end
+
+        local group = groups[key]
+        if not group then
+            group = {c = 0, f = {}}
+            groups[key] = group
+        end
+
+        group.c = group.c + 1
+
+        for _, field in ipairs(spec.fields) do
+            local value = obj[field]
+
+            if type(value) == 'number' then
+                local stats = group.f[field]
+
+                if not stats then
+                    group.f[field] = {n = 1, s = value, mn = value, mx = value}
+                else
+                    stats.n = stats.n + 1
+                    stats.s = stats.s + value
+                    stats.mn = math.min(stats.mn, value)
+                    stats.mx = math.max(stats.mx, value)
+                end
+            end
+        end
+    end
+end
+
+-- cjson keeps 14 significant digits, so numbers are sent as strings
+for _, group in pairs(groups) do
+    for _, stats in pairs(group.f) do
+        stats.s = string.format('%.17g', stats.s)
+        stats.mn = string.format('%.17g', stats.mn)
+        stats.mx = string.format('%.17g', stats.mx)
+    end
+end
+
+return cjson.encode({cursor = res[1], groups = groups})
+"""
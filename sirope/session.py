@@ -0,0 +1,99 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+from typing import Iterable
+
+from sirope.oid import OID
+
+
+class Session:
+    """A unit of work over a Sirope object.
+       Repeated loads of an OID return the same object, without I/O,
+       while saves and deletes are buffered until flush(), which writes
+       them all atomically: if a save violates a unique constraint,
+       nothing is written, and the buffers are kept.
+       Used as a context manager, it flushes on exit,
+       unless an exception was raised.
+    """
+    def __init__(self, sirope):
+        self._sirope = sirope
+        self._identity_map: "dict[OID, object]" = {}
+        self._saves: "dict[OID, object]" = {}
+        self._deletes: "dict[OID, None]" = {}
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.clear()
+
+        return False
+
+    def load(self, oid: OID) -> "object|None":
+        """Loads an object, through the identity map.
+           Returns None for objects deleted in this session.
+        """
+        if oid in self._deletes:
+            return None
+
+        toret = self._identity_map.get(oid)
+
+        if toret is None:
+            toret = self._sirope.load(oid)
+            self._identity_map[oid] = toret
+
+        return toret
+
+    def multi_load(self, oids: "list[OID]") -> Iterable["object|None"]:
+        """Loads the objects for these oids, in order, through the
+           identity map. Missing or deleted objects are returned as None.
+        """
+        missing = [oid for oid in oids
+                   if oid not in self._identity_map
+                   and oid not in self._deletes]
+
+        for oid, obj in zip(missing,
+                            self._sirope.multi_load_ordered(missing)):
+            if obj is not None:
+                self._identity_map[oid] = obj
+
+        for oid in oids:
+            yield (None if oid in self._deletes
+                        else self._identity_map.get(oid))
+
+    def save(self, obj: object) -> OID:
+        """Buffers the save of this object.
+           New objects get their OID immediately.
+        """
+        oid = self._sirope._oid_for(obj)
+        self._deletes.pop(oid, None)
+        self._identity_map[oid] = obj
+        self._saves[oid] = obj
+        return oid
+
+    def delete(self, oid: OID):
+        """Buffers the deletion of this object."""
+        self._identity_map.pop(oid, None)
+        self._saves.pop(oid, None)
+        self._deletes[oid] = None
+
+    def multi_delete(self, oids: "list[OID]"):
+        """Buffers the deletion of these objects."""
+        for oid in oids:
+            self.delete(oid)
+
+    def flush(self):
+        """Writes all buffered saves and deletes, atomically."""
+        if self._saves or self._deletes:
+            self._sirope._write(self._saves.values(), self._deletes.keys())
+            self._saves.clear()
+            self._deletes.clear()
+
+    def clear(self):
+        """Discards the identity map and the buffered saves and deletes."""
+        self._identity_map.clear()
+        self._saves.clear()
+        self._deletes.clear()
@@ -2,96 +2,787 @@
 
 
 from collections import defaultdict
+import json
+import time
+import base64
 from typing import Callable
 from typing import Iterable
+from typing import IO
 import redis
 
+from sirope import scripts
 from sirope.oid import OID
-from sirope.coders import JSONCoder
 from sirope.coders import JSONDCoder
+from sirope.aggregates import Metric
+from sirope.aggregates import count
 from sirope.safeindex import SafeIndex
-from sirope.utils import full_name_from_obj
-from sirope.utils import cls_from_str
+from sirope import transfer
+from sirope import columns
+from sirope.changefeed import ChangeFeed
+from sirope.changefeed import ChangeConsumer
+from sirope.unique import UniqueConstraint
+from sirope.unique import UniqueConstraintError
+from sirope.textindex import TextIndex
+from sirope.geoindex import GeoIndex
+from sirope.replicas import ReplicaSet
+from sirope.session import Session
+from sirope.backends import UnsupportedScript
+from sirope.writebehind import WriteBehind
+from sirope.registry import codec_for
+from sirope.registry import codec_for_ns
 
 
 class Sirope:
     OID_ID = "__oid__"
     NEXT_IDS_ID = "__next_ids__"
+    EXPIRY_PREFIX = "__expiry__:"
+    EXPIRING_ID = "__expiring__"
+    EXPIRING_REFRESH = 5.0
+    CHUNK_SIZE = 500
 
-    def __init__(self, redis_obj: redis.Redis=None):
+    def __init__(self, redis_obj: redis.Redis=None,
+                 replicas: "list[redis.Redis]|None"=None,
+                 read_policy: str=ReplicaSet.ROUND_ROBIN,
+                 read_your_writes: float=0.0,
+                 chunk_size: int=CHUNK_SIZE):
         """Creates a Sirope object from a given Redis.
-            :param redis: A Redis object or None.
+            :param redis: A Redis object, an embedded backend
+                          (see sirope.backends) or None.
+            :param replicas: Redis objects of replicas to read from, or None.
+            :param read_policy: ReplicaSet.ROUND_ROBIN or
+                                ReplicaSet.LEAST_LATENCY.
+            :param read_your_writes: Seconds after a save or delete in which
+                                     reads of that class use the primary.
+            :param chunk_size: Max. number of entries retrieved per round
+                               trip when streaming a whole class.
         """
         if not redis_obj:
             self._redis = redis.Redis()
         else:
             self._redis = redis_obj
         self._indexes = SafeIndex.get(self._redis)
+        self._replicas = ReplicaSet(self._redis, replicas,
+                                    read_policy, read_your_writes)
+        self._chunk_size = max(1, chunk_size)
+        self._scan_no_values = True
+        self._feeds: "dict[str, ChangeFeed]" = {}
+        self._uniques: "dict[str, list[UniqueConstraint]]" = {}
+        self._texts: "dict[str, list[TextIndex]]" = {}
+        self._geos: "dict[str, GeoIndex]" = {}
+        self._expiring: "set[str]" = set()
+        self._expiring_read_at = None
+        self._native_ttl = None
+        self._write_script = self._redis.register_script(scripts.WRITE)
+        self._aggregate_script = self._redis.register_script(
+                                                        scripts.AGGREGATE)
+
+    def _reader(self, ns: "str|None"=None) -> redis.Redis:
+        """Returns the Redis object to read this namespace from."""
+        return self._replicas.for_read(ns)
+
+    def __scan(self, ns: str, chunk_size: int=0) -> Iterable[tuple]:
+        """Streams the (key, value) pairs of this namespace, in chunks."""
+        count = chunk_size or self._chunk_size
+        return self._reader(ns).hscan_iter(ns, count=count)
+
+    def __scan_keys(self, ns: str, chunk_size: int=0) -> Iterable[bytes]:
+        """Streams the keys of this namespace, in chunks.
+           Servers older than Redis 7.4 do not support HSCAN NOVALUES,
+           so values are then retrieved and discarded chunk by chunk.
+        """
+        count = chunk_size or self._chunk_size
+        client = self._reader(ns)
+        keys = None
+
+        if self._scan_no_values:
+            try:
+                cursor, keys = client.hscan(ns, 0,
+                                            count=count, no_values=True)
+            except (redis.ResponseError, TypeError):
+                self._scan_no_values = False
+
+        if keys is None:
+            for k, _ in client.hscan_iter(ns, count=count):
+                yield k
+        else:
+            yield from keys
+            while cursor != 0:
+                cursor, keys = client.hscan(ns, cursor,
+                                            count=count, no_values=True)
+                yield from keys
 
     def __create_next_id(self, ns: str):
         return self._redis.hincrby(Sirope.NEXT_IDS_ID, ns, 1) - 1
 
     def __get_next_id(self, ns: str):
-        bytes_toret = self._redis.hget(Sirope.NEXT_IDS_ID, ns)
+        bytes_toret = self._reader(ns).hget(Sirope.NEXT_IDS_ID, ns)
 
         if not bytes_toret:
             bytes_toret = b'0'
 
         return int(bytes_toret.decode("utf-8", "replace"))
 
-    def save(self, obj: object) -> OID:
-        """Saves an object to the Redis store."""
-        oid = obj.__dict__.get(Sirope.OID_ID)
+    def _oid_for(self, obj: object) -> OID:
+        """Returns the OID of this object, assigning a new one if needed."""
+        codec = codec_for(obj.__class__)
+        oid = codec.get_oid(obj)
 
         if not oid:
-            num_id = self.__create_next_id(full_name_from_obj(obj))
-            oid = OID(obj.__class__, num_id)
+            num_id = self.__create_next_id(codec.namespace)
+            oid = OID.from_pair((codec.namespace, num_id))
 
             # Add the oid to the object
-            obj.__dict__[Sirope.OID_ID] = oid
+            codec.set_oid(obj, oid)
 
-        self._redis.hset(
-            oid.namespace,
-            str(oid.num),
-            Sirope.__json_from_obj(obj))
+        return oid
 
-        return obj.__dict__[Sirope.OID_ID]
+    def _write(self, objs: "Iterable[object]", oids: "Iterable[OID]"):
+        """Saves the objects and deletes the oids (and their safe indexes),
+           atomically.
+        """
+        saves = []
 
-    def load(self, oid: OID) -> object:
-        """Loads an object from the Redis store"""
+        for obj in objs:
+            oid = self._oid_for(obj)
+            saves.append((oid, codec_for(obj.__class__).encode(obj), None))
+
+        self._write_json(saves, list(oids))
+
+    def _write_json(self, saves: "list[tuple[OID, str, float|None]]",
+                    oids: "list[OID]") -> int:
+        """Saves the JSON of objects and deletes the oids
+           (and their safe indexes), atomically.
+           Classes with data to maintain are written by a single call
+           to the Lua script, which checks unique fields before writing
+           anything, otherwise a MULTI/EXEC pipeline is used.
+            :param saves: (oid, JSON, seconds to live or None) triples.
+            :param oids: The oids to delete.
+            :return: The number of deleted objects.
+        """
+        nss = {oid.namespace for oid, _, _ in saves}
+        nss.update(oid.namespace for oid in oids)
+        self.__read_expiring()
+        new_expiring = {oid.namespace for oid, _, ttl in saves
+                        if ttl is not None} - self._expiring
+
+        if new_expiring:
+            self.__check_scripts("Saving with a ttl")
+            self._expiring.update(new_expiring)
+
+        try:
+            if any(self.__is_maintained(ns) for ns in nss):
+                toret = self.__run_write_script(saves, oids)
+            elif len(saves) == 1 and not oids:
+                oid, json_obj, _ = saves[0]
+                self._redis.hset(oid.namespace, str(oid.num), json_obj)
+                toret = 0
+            else:
+                toret = self.__write_plain(saves, oids)
+        except BaseException:
+            self._expiring.difference_update(new_expiring)
+            raise
+
+        for ns in new_expiring:
+            self.__declare_expiring(ns)
+
+        for ns in nss:
+            self._replicas.wrote(ns)
+
+        return toret
+
+    def __write_plain(self, saves: "list[tuple[OID, str, float|None]]",
+                      oids: "list[OID]") -> int:
+        """Writes objects of classes with no data to maintain,
+           in a MULTI/EXEC pipeline. The safe indexes of the deleted
+           objects are read watching them, and the write is retried
+           if they changed in the meantime.
+        """
+        dict_objs = defaultdict(list)
+
+        for oid in oids:
+            dict_objs[oid.namespace].append(str(oid.num))
+
+        while True:
+            with self._redis.pipeline(transaction=True) as pipe:
+                try:
+                    if oids:
+                        pipe.watch(SafeIndex.OIDS_INDEXES_STORE_NAME)
+
+                    soids = self._indexes.read_for(pipe, oids)
+                    pipe.multi()
+
+                    for oid, json_obj, _ in saves:
+                        pipe.hset(oid.namespace, str(oid.num), json_obj)
+
+                    for ns, nums in dict_objs.items():
+                        pipe.hdel(ns, *nums)
+
+                    self._indexes.queue_delete_for(pipe, oids, soids)
+                    results = pipe.execute()
+                    return sum(results[len(saves):
+                                       len(saves) + len(dict_objs)])
+                except redis.WatchError:
+                    continue
+
+    def __check_scripts(self, what: str):
+        """Raises NotImplementedError if the store cannot run
+           the Lua scripts, needed for what.
+        """
+        if isinstance(self._write_script, UnsupportedScript):
+            raise NotImplementedError(what + " needs a Redis server")
+
+    def __declare_expiring(self, ns: str):
+        """Records that objects of this namespace may expire,
+           for all Sirope objects, so they remove stale deadlines.
+        """
+        self._expiring.add(ns)
+        self._redis.hset(Sirope.EXPIRING_ID, ns, 1)
+
+    def __read_expiring(self):
+        """Reads the namespaces declared as expiring by any Sirope object,
+           at most once every EXPIRING_REFRESH seconds.
+        """
+        now = time.monotonic()
+
+        if (self._expiring_read_at is None
+         or now - self._expiring_read_at >= Sirope.EXPIRING_REFRESH):
+            self._expiring_read_at = now
+            self._expiring.update(
+                        ns.decode("utf-8", "replace")
+                        for ns in self._redis.hkeys(Sirope.EXPIRING_ID))
+
+    def __is_maintained(self, ns: str) -> bool:
+        """Determines whether the Lua script maintains data
+           for this namespace.
+        """
+        return (ns in self._feeds or ns in self._uniques
+                or ns in self._texts or ns in self._geos
+                or ns in self._expiring)
+
+    def __spec(self, ns: str, keys: scripts.KeyList) -> dict:
+        """Returns the spec of the data maintained for this namespace
+           by the Lua script.
+        """
+        feed = self._feeds.get(ns)
+        geo = self._geos.get(ns)
+        toret = {"key": keys.index(ns),
+                 "feed": feed.spec(keys) if feed else False,
+                 "uniques": [u.spec(keys) for u in self._uniques.get(ns, [])],
+                 "texts": [t.spec(keys) for t in self._texts.get(ns, [])],
+                 "geo": keys.index(geo.key) if geo else False,
+                 "expiry": False}
+
+        if ns in self._expiring:
+            toret["expiry"] = {"key": keys.index(Sirope.EXPIRY_PREFIX + ns),
+                               "native": self.__has_native_ttl()}
+
+        return toret
+
+    def __save_spec(self, keys: scripts.KeyList, oid: OID, json_obj: str,
+                    ttl: "float|None", stored_tokens: dict) -> dict:
+        """Returns the spec of a save for the Lua script."""
         ns = oid.namespace
-        cls = cls_from_str(ns)
+        num = str(oid.num)
+        uniques = self._uniques.get(ns, [])
+        texts = self._texts.get(ns, [])
+        geo = self._geos.get(ns)
+        toret = {"ns": ns, "num": num, "ttl": False,
+                 "uniques": [], "texts": [], "geo": False}
 
-        if not cls:
-            raise NameError(ns)
+        if ttl is not None:
+            toret["ttl"] = max(1, int(ttl * 1000))
+
+        if uniques or texts or geo:
+            obj_dict = json.loads(json_obj)
+            toret["uniques"] = [u.key_for_obj(obj_dict) for u in uniques]
+            toret["texts"] = [t.tokens_spec(keys,
+                                            stored_tokens[(ns, num, t.field)],
+                                            t.tokens(obj_dict.get(t.field)))
+                              for t in texts]
+
+            if geo:
+                toret["geo"] = geo.coords_for(obj_dict)
+
+        return toret
+
+    def __delete_spec(self, keys: scripts.KeyList, oid: OID,
+                      stored_tokens: dict) -> dict:
+        """Returns the spec of a deletion for the Lua script."""
+        ns = oid.namespace
+        num = str(oid.num)
+        return {"ns": ns, "num": num,
+                "texts": [t.tokens_spec(keys,
+                                        stored_tokens[(ns, num, t.field)])
+                          for t in self._texts.get(ns, [])]}
+
+    def __stored_tokens(self, oids: "list[OID]") -> dict:
+        """Reads the tokens stored for these objects in the text indexes
+           of their classes, in a single round trip.
+            :return: The tokens (or None) by (ns, num, field).
+        """
+        toret = {}
+        pipe = self._redis.pipeline(transaction=False)
+
+        for oid in oids:
+            for text in self._texts.get(oid.namespace, []):
+                toret[(oid.namespace, str(oid.num), text.field)] = None
+                pipe.hget(text.rev_index, str(oid.num))
+
+        if toret:
+            toret = dict(zip(toret, pipe.execute()))
+
+        return toret
+
+    def __has_native_ttl(self) -> bool:
+        """Determines whether the server supports hash field expiry
+           (Redis 7.4+), probing HPEXPIRE on a missing key.
+        """
+        if self._native_ttl is None:
+            try:
+                self._redis.execute_command(
+                                    "HPEXPIRE", Sirope.EXPIRY_PREFIX,
+                                    1, "FIELDS", 1, "0")
+                self._native_ttl = True
+            except redis.ResponseError:
+                self._native_ttl = False
+
+        return self._native_ttl
+
+    def __run_write_script(self, saves: "list[tuple[OID, str, float|None]]",
+                           oids: "list[OID]", sweep: bool=False) -> int:
+        """Writes the objects through the Lua script,
+           raising UniqueConstraintError if a save violated
+           a unique constraint, in which case nothing is written.
+           The tokens of text indexes are read before, and the call
+           is retried if they changed in the meantime.
+            :param sweep: If True, only expired objects are deleted.
+            :return: The number of deleted objects.
+        """
+        nss = {oid.namespace for oid, _, _ in saves}
+        nss.update(oid.namespace for oid in oids)
+        args = [json_obj for _, json_obj, _ in saves]
+
+        while True:
+            keys = scripts.KeyList()
+            stored_tokens = self.__stored_tokens(
+                                        [oid for oid, _, _ in saves] + oids)
+            spec = {"nss": {ns: self.__spec(ns, keys) for ns in nss},
+                    "saves": [self.__save_spec(keys, oid, json_obj, ttl,
+                                               stored_tokens)
+                              for oid, json_obj, ttl in saves],
+                    "deletes": [self.__delete_spec(keys, oid, stored_tokens)
+                                for oid in oids],
+                    "sweep": sweep,
+                    "safe": [keys.index(SafeIndex.INDEXES_OIDS_STORE_NAME),
+                             keys.index(SafeIndex.OIDS_INDEXES_STORE_NAME)]}
+
+            try:
+                return self._write_script(keys=keys.names,
+                                          args=[json.dumps(spec)] + args,
+                                          client=self._redis)
+            except redis.ResponseError as exc:
+                if not str(exc).startswith(scripts.STALE):
+                    raise (UniqueConstraintError.from_response_error(exc)
+                           or exc)
+
+    def change_feed(self, cls: type, maxlen: int=10000,
+                    fields: bool=False):
+        """Records each save or delete of objects of this class
+           in a Redis Stream, atomically with the write.
+            :param cls: The class.
+            :param maxlen: Approx. max. number of records kept.
+            :param fields: Whether to record the changed fields.
+        """
+        ns = codec_for(cls).namespace
+        self._feeds[ns] = ChangeFeed(ns, maxlen, fields)
+
+    def unique(self, cls: type, field: str, backfill: bool=True):
+        """Makes this field unique among the objects of this class.
+           Saves raise UniqueConstraintError on duplicated values,
+           checked atomically with the write.
+           The index is only maintained by the Sirope objects declaring
+           the constraint, so all of them writing this class must do so.
+            :param cls: The class.
+            :param field: The name of the field.
+            :param backfill: Whether to rebuild the index from the objects
+                             already stored, raising UniqueConstraintError
+                             if there are duplicated values among them.
+        """
+        ns = codec_for(cls).namespace
+
+        if all(u.field != field for u in self._uniques.get(ns, [])):
+            constraint = UniqueConstraint(ns, field)
+
+            if backfill:
+                self.__build_unique_index(ns, constraint)
+
+            self._uniques.setdefault(ns, []).append(constraint)
+
+    def __build_unique_index(self, ns: str, constraint: UniqueConstraint):
+        """Rebuilds the index of a unique field from the objects stored,
+           scanning them in chunks.
+        """
+        decoder = json.JSONDecoder()
+        nums = {}
+
+        for num, json_obj in self._redis.hscan_iter(ns,
+                                                    count=self._chunk_size):
+            key = constraint.key_for_obj(
+                        decoder.decode(json_obj.decode("utf-8", "replace")))
+
+            if key:
+                if nums.setdefault(key, num) != num:
+                    raise UniqueConstraintError(ns, constraint.field)
+
+        entries = list(nums.items())
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(constraint.index, constraint.rev_index)
+
+        for i in range(0, len(entries), self._chunk_size):
+            chunk = entries[i:i + self._chunk_size]
+            pipe.hset(constraint.index, mapping=dict(chunk))
+            pipe.hset(constraint.rev_index,
+                      mapping={num: key for key, num in chunk})
+
+        pipe.execute()
+
+    def load_by_unique(self, cls: type, field: str,
+                       value: object) -> "object|None":
+        """Returns the object with this value in the unique field,
+           or None if there is no such object.
+        """
+        ns = codec_for(cls).namespace
+        toret = None
+        constraint = UniqueConstraint(ns, field)
+        key = constraint.key_for_value(value)
+
+        if key:
+            num = self._reader(ns).hget(constraint.index, key)
+
+            if num:
+                toret = next(iter(self.multi_load_ordered(
+                                        [OID.from_pair((ns, num))],
+                                        skip_missing=True)), None)
+
+        return toret
+
+    def text_index(self, cls: type, field: str, ngrams: int=0,
+                   backfill: bool=True):
+        """Indexes the words of this string field of the objects
+           of this class, so they can be found with search().
+           Embedded backends raise NotImplementedError.
+            :param cls: The class.
+            :param field: The name of the field.
+            :param ngrams: If not 0, words are indexed by their n-grams,
+                           so fragments of words can be searched.
+            :param backfill: Whether to rebuild the index from the objects
+                             already stored.
+        """
+        self.__check_scripts("Text indexes")
+        ns = codec_for(cls).namespace
+        texts = self._texts.setdefault(ns, [])
+
+        if all(t.field != field for t in texts):
+            index = TextIndex(ns, field, ngrams)
+
+            if backfill:
+                self.__build_text_index(ns, index)
+
+            texts.append(index)
+
+    def __build_text_index(self, ns: str, index: TextIndex):
+        """Rebuilds a text index from the objects stored,
+           scanning them in chunks.
+        """
+        old_keys = set()
+
+        for _, tokens in self._redis.hscan_iter(index.rev_index,
+                                                count=self._chunk_size):
+            old_keys.update(index.key_for(token)
+                            for token in tokens.decode("utf-8").split())
+
+        old_keys = [index.rev_index] + sorted(old_keys)
+        pipe = self._redis.pipeline(transaction=False)
+
+        for i in range(0, len(old_keys), self._chunk_size):
+            pipe.delete(*old_keys[i:i + self._chunk_size])
+
+        pipe.execute()
+        decoder = json.JSONDecoder()
+        postings = defaultdict(list)
+        revs = {}
+
+        for num, json_obj in self._redis.hscan_iter(ns,
+                                                    count=self._chunk_size):
+            obj_dict = decoder.decode(json_obj.decode("utf-8", "replace"))
+            tokens = index.tokens(obj_dict.get(index.field))
+
+            if tokens:
+                revs[num] = " ".join(tokens)
+
+                for token in tokens:
+                    postings[token].append(num)
+
+            if len(revs) >= self._chunk_size:
+                Sirope.__write_postings(pipe, index, postings, revs)
+
+        Sirope.__write_postings(pipe, index, postings, revs)
+
+    @staticmethod
+    def __write_postings(pipe, index: TextIndex,
+                         postings: "dict[str, list[bytes]]",
+                         revs: "dict[bytes, str]"):
+        """Writes a chunk of a text index being rebuilt,
+           and clears it.
+        """
+        if revs:
+            for token, nums in postings.items():
+                pipe.sadd(index.key_for(token), *nums)
+
+            pipe.hset(index.rev_index, mapping=revs)
+            pipe.execute()
+            postings.clear()
+            revs.clear()
+
+    def search(self, cls: type, field: str, text: str,
+               limit: int=0) -> "list[object]":
+        """Returns the objects of this class with all the words
+           of text in the field, in stored order. The posting lists
+           of the words are intersected in the server.
+            :param cls: The class.
+            :param field: A field indexed with text_index().
+            :param text: The words (or fragments) to search for.
+            :param limit: Max. number of objects, 0 for all.
+        """
+        ns = codec_for(cls).namespace
+        index = next((t for t in self._texts.get(ns, [])
+                      if t.field == field), None)
+
+        if not index:
+            raise ValueError(f"{ns}: no text index on '{field}'")
+
+        tokens = index.tokens(text)
+
+        if not tokens:
+            return []
+
+        nums = self._reader(ns).sinter([index.key_for(t) for t in tokens])
+        oids = [OID.from_pair((ns, num))
+                for num in sorted(int(n) for n in nums)]
+        toret = []
+
+        for i in range(0, len(oids), self._chunk_size):
+            objs = self.multi_load_ordered(oids[i:i + self._chunk_size],
+                                           skip_missing=True)
+
+            if index.ngrams:
+                codec = codec_for(cls)
+                objs = [obj for obj in objs
+                        if index.matches(codec.to_dict(obj).get(field),
+                                         text)]
+
+            toret.extend(objs)
 
+            if 0 < limit <= len(toret):
+                del toret[limit:]
+                break
+
+        return toret
+
+    def geo_index(self, cls: type, lat_field: str, lon_field: str,
+                  backfill: bool=True):
+        """Indexes the coordinates of the objects of this class,
+           so they can be found with near().
+           Embedded backends raise NotImplementedError.
+            :param cls: The class.
+            :param lat_field: The name of the field with the latitude.
+            :param lon_field: The name of the field with the longitude.
+            :param backfill: Whether to rebuild the index from the objects
+                             already stored.
+        """
+        self.__check_scripts("Geo indexes")
+        ns = codec_for(cls).namespace
+        index = GeoIndex(ns, lat_field, lon_field)
+
+        if backfill:
+            self.__build_geo_index(ns, index)
+
+        self._geos[ns] = index
+
+    def __build_geo_index(self, ns: str, index: GeoIndex):
+        """Rebuilds a geo index from the objects stored,
+           scanning them in chunks.
+        """
+        decoder = json.JSONDecoder()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.delete(index.key)
+        values = []
+
+        for num, json_obj in self._redis.hscan_iter(ns,
+                                                    count=self._chunk_size):
+            coords = index.coords_for(
+                        decoder.decode(json_obj.decode("utf-8", "replace")))
+
+            if coords:
+                values.extend(coords + [num])
+
+            if len(values) >= 3 * self._chunk_size:
+                pipe.geoadd(index.key, values)
+                pipe.execute()
+                values = []
+
+        if values:
+            pipe.geoadd(index.key, values)
+
+        pipe.execute()
+
+    def near(self, cls: type, lat: float, lon: float, radius: float,
+             limit: int=0, unit: str="m") -> "list[object]":
+        """Returns the objects of this class within radius
+           of the given coordinates, nearest first,
+           loading them with a single HMGET.
+            :param cls: The class, indexed with geo_index().
+            :param lat: The latitude.
+            :param lon: The longitude.
+            :param radius: The radius.
+            :param limit: Max. number of objects, 0 for all.
+            :param unit: The unit of radius: m, km, mi or ft.
+        """
+        ns = codec_for(cls).namespace
+        index = self._geos.get(ns)
+
+        if not index:
+            raise ValueError(f"{ns}: no geo index")
+
+        client = self._reader(ns)
+        nums = client.geosearch(index.key, longitude=lon, latitude=lat,
+                                radius=radius, unit=unit, sort="ASC",
+                                count=limit or None)
+        toret = []
+
+        if nums:
+            for json_obj in client.hmget(ns, nums):
+                if json_obj:
+                    toret.append(Sirope.__obj_from_json(cls, json_obj))
+
+        return toret
+
+    def _change_feed_for(self, cls: type) -> ChangeFeed:
+        ns = codec_for(cls).namespace
+        return self._feeds.get(ns) or ChangeFeed(ns)
+
+    def changes(self, cls: type, group: str, consumer: str,
+                start_id: str="0") -> ChangeConsumer:
+        """Returns a consumer of the change feed of this class,
+           as a member of the given consumer group.
+        """
+        return ChangeConsumer(self, cls, group, consumer, start_id)
+
+    def session(self) -> "Session":
+        """Returns a new unit of work, to be used as a context manager.
+           Loads are cached in its identity map, while saves and deletes
+           are buffered, and written together on exit.
+        """
+        return Session(self)
+
+    def write_behind(self, max_batch: int=500, max_delay: float=0.05,
+                     max_pending: int=10000) -> "WriteBehind":
+        """Returns a write-behind saver, to be closed when done.
+           Saves are coalesced by OID and written in the background,
+           in pipelined batches of up to max_batch objects, at most
+           max_delay seconds after being requested. Saves block while
+           there are max_pending objects waiting to be written.
+        """
+        return WriteBehind(self, max_batch, max_delay, max_pending)
+
+    def expiring(self, cls: type):
+        """Declares that objects of this class may be saved with a ttl,
+           so saves with no ttl remove any previous expiry.
+           This is implicit after the first save with a ttl,
+           and is shared by all Sirope objects on the same Redis.
+           Embedded backends raise NotImplementedError.
+        """
+        self.__check_scripts("Expiry")
+        self.__declare_expiring(codec_for(cls).namespace)
+
+    def sweep_expired(self, cls: type, batch_size: int=100,
+                      max_objs: int=0) -> int:
+        """Deletes the expired objects of this class, in batches,
+           along with their safe indexes and the data of their class.
+           Servers with no hash field expiry (before Redis 7.4) keep
+           expired objects until they are swept. Objects saved again
+           with no ttl after their deadline was set are kept.
+            :param cls: The class.
+            :param batch_size: Max. number of objects per batch.
+            :param max_objs: Max. number of objects to sweep, 0 for all.
+            :return: The number of objects swept.
+        """
+        self.__check_scripts("Sweeping")
+        ns = codec_for(cls).namespace
+        self.__declare_expiring(ns)
+        key = Sirope.EXPIRY_PREFIX + ns
+        toret = 0
+
+        while max_objs <= 0 or toret < max_objs:
+            num = batch_size
+            if max_objs > 0:
+                num = min(num, max_objs - toret)
+
+            now = self._redis.time()
+            nums = self._redis.zrangebyscore(
+                                    key, "-inf",
+                                    now[0] * 1000 + now[1] // 1000,
+                                    start=0, num=num)
+
+            if not nums:
+                break
+
+            oids = [OID.from_pair((ns, n)) for n in nums]
+            toret += self.__run_write_script([], oids, sweep=True)
+            self._replicas.wrote(ns)
+
+        return toret
+
+    def save(self, obj: object, ttl: "float|None"=None) -> OID:
+        """Saves an object to the Redis store.
+            :param obj: The object to save.
+            :param ttl: Seconds until the object expires,
+                        or None for no expiry. Embedded backends
+                        raise NotImplementedError.
+        """
+        if ttl is not None:
+            self.__check_scripts("Saving with a ttl")
+
+        oid = self._oid_for(obj)
+        self._write_json([(oid, codec_for(obj.__class__).encode(obj), ttl)],
+                         [])
+        return oid
+
+    def load(self, oid: OID) -> object:
+        """Loads an object from the Redis store"""
+        ns = oid.namespace
+        cls = codec_for_ns(ns).cls
         str_num = str(oid.num)
-        return Sirope.__obj_from_json(cls, self._redis.hget(ns, str_num))
+        return Sirope.__obj_from_json(cls, self._reader(ns).hget(ns, str_num))
 
     def exists(self, oid: OID) -> bool:
         """Determines whether an object exists or not."""
-        return self._redis.hexists(oid.namespace, str(oid.num))
+        ns = oid.namespace
+        return self._reader(ns).hexists(ns, str(oid.num))
 
     def delete(self, oid: OID) -> bool:
         """Deletes a given object."""
-        self._indexes.delete_for(oid)
-        return self._redis.hdel(oid.namespace, str(oid.num)) > 0
+        return self._write_json([], [oid]) > 0
 
     def multi_delete(self, oids: "list[OID]") -> None:
         """Deletes multiple objects"""
         if oids:
-            dict_objs = defaultdict(list)
-
-            for oid in oids:
-                self._indexes.delete_for(oid)
-                dict_objs[oid.namespace].append(str(oid.num))
-
-            for ns, lnums in dict_objs.items():
-                self._redis.hdel(ns, *lnums)
+            self._write([], oids)
 
     def num_objs(self, cls: type) -> int:
         """Returns the total number of objects stored for this class."""
-        return self._redis.hlen(full_name_from_obj(cls))
+        ns = codec_for(cls).namespace
+        return self._reader(ns).hlen(ns)
 
     def num_safe_indexes(self) -> int:
         """Returns the total number of safe indexes for this class."""
@@ -99,8 +790,10 @@ class Sirope:
 
     def enumerate(self, cls: type, max: int = 0) -> Iterable[object]:
         """Returns all objects stored for this class, as an iterator."""
+        ns = codec_for(cls).namespace
+
         num = 0
-        for vp in self._redis.hscan_iter(full_name_from_obj(cls)):
+        for vp in self.__scan(ns):
             yield Sirope.__obj_from_json(cls, vp[1])
 
             num += 1
@@ -108,11 +801,14 @@ class Sirope:
             and num >= max):
                 break
 
-    def load_all(self, cls: type) -> Iterable[object]:
-        """Returns an iterable for all objects stored for this class."""
-        json_objs = self._redis.hvals(full_name_from_obj(cls))
-        for obj in json_objs:
-            yield Sirope.__obj_from_json(cls, obj)
+    def load_all(self, cls: type, chunk_size: int=0) -> Iterable[object]:
+        """Returns an iterable for all objects stored for this class.
+           Objects are retrieved in chunks of about chunk_size entries
+           (the default chunk size if 0), so memory use stays bounded.
+        """
+        ns = codec_for(cls).namespace
+        for vp in self.__scan(ns, chunk_size):
+            yield Sirope.__obj_from_json(cls, vp[1])
 
     def load_first(self, cls: type, num: int) -> Iterable[object]:
         """Returns the first max objects in stored order for this class."""
@@ -123,7 +819,7 @@ class Sirope:
 
         # Retrieve in store order
         i = 0
-        cls_name = full_name_from_obj(cls)
+        cls_name = codec_for(cls).namespace
         while num > 0:
             obj = self.load(OID.from_pair((cls_name, i)))
             i += 1
@@ -140,7 +836,7 @@ class Sirope:
         num = min(num, num_objs)
 
         # Retrieve in store order
-        cls_name = full_name_from_obj(cls)
+        cls_name = codec_for(cls).namespace
         i = self.__get_next_id(cls_name) - 1
         while num > 0:
             obj = self.load(OID.from_pair((cls_name, i)))
@@ -160,23 +856,73 @@ class Sirope:
             dict_objs[oid.namespace].append(str(oid.num))
 
         for ns, keys in dict_objs.items():
-            cls = cls_from_str(ns)
-            for jobj in self._redis.hmget(ns, *keys):
+            cls = codec_for_ns(ns).cls
+            for jobj in self._reader(ns).hmget(ns, *keys):
                 yield Sirope.__obj_from_json(cls, jobj)
 
-    def load_all_keys(self, cls: type) -> Iterable[OID]:
-        """Returns an iterable of oid's of stored objects for this class."""
-        ns = full_name_from_obj(cls)
-        keys = self._redis.hkeys(ns)
-        for k in keys:
+    def multi_load_ordered(self, oids: "list[OID]",
+                           skip_missing: bool=False,
+                           chunk_size: int=0) -> Iterable["object|None"]:
+        """Returns an iterable for the objects corresponding
+           to the oids in the given list, in the same order.
+           Repeated oids are retrieved once, and yield the same object.
+            :param oids: The list of oids.
+            :param skip_missing: If True, missing objects are skipped,
+                                 otherwise None is returned in their place.
+            :param chunk_size: Max. number of objects per HMGET
+                               (the default chunk size if 0).
+        """
+        chunk_size = chunk_size or self._chunk_size
+        dict_objs = defaultdict(list)
+
+        for oid in dict.fromkeys(oids):
+            dict_objs[oid.namespace].append(oid)
+
+        # Queue all chunks, in a pipeline per connection
+        pipes = {}
+        requests = []
+        for ns, ns_oids in dict_objs.items():
+            cls = codec_for_ns(ns).cls
+            client = self._reader(ns)
+            pipe = pipes.get(id(client))
+
+            if pipe is None:
+                pipe = client.pipeline(transaction=False)
+                pipes[id(client)] = pipe
+
+            for i in range(0, len(ns_oids), chunk_size):
+                chunk = ns_oids[i:i + chunk_size]
+                pipe.hmget(ns, *[str(oid.num) for oid in chunk])
+                requests.append((pipe, cls, chunk))
+
+        results = {id(pipe): iter(pipe.execute()) for pipe in pipes.values()}
+        loaded = {}
+        for pipe, cls, chunk in requests:
+            for oid, jobj in zip(chunk, next(results[id(pipe)])):
+                if jobj:
+                    loaded[oid] = Sirope.__obj_from_json(cls, jobj)
+
+        for oid in oids:
+            obj = loaded.get(oid)
+
+            if obj is not None or not skip_missing:
+                yield obj
+
+    def load_all_keys(self, cls: type, chunk_size: int=0) -> Iterable[OID]:
+        """Returns an iterable of oid's of stored objects for this class.
+           Keys are retrieved in chunks of about chunk_size entries
+           (the default chunk size if 0), so memory use stays bounded.
+        """
+        ns = codec_for(cls).namespace
+        for k in self.__scan_keys(ns, chunk_size):
             yield OID.from_pair((ns, k))
 
     def filter(self, cls: type, pred: Callable, max: int=0) -> Iterable[object]:
         """Returns an iterable for the objects complaint with the pred."""
-        ns = full_name_from_obj(cls)
+        ns = codec_for(cls).namespace
 
         num = 0
-        for vp in self._redis.hscan_iter(ns):
+        for vp in self.__scan(ns):
             obj = Sirope.__obj_from_json(cls, vp[1])
 
             if pred(obj):
@@ -188,10 +934,10 @@ class Sirope:
 
     def find_first(self, cls: type, pred: Callable) -> "object|None":
         """Returns the first object compliant with pred, or None."""
-        ns = full_name_from_obj(cls)
+        ns = codec_for(cls).namespace
         toret = None
 
-        for vp in self._redis.hscan_iter(ns):
+        for vp in self.__scan(ns):
             obj = Sirope.__obj_from_json(cls, vp[1])
 
             if pred(obj):
@@ -200,6 +946,236 @@ class Sirope:
 
         return toret
 
+    def enumerate_page(self, cls: type, cursor: "str|None"=None,
+                       count: int=10) -> "tuple[list[object], str|None]":
+        """Returns a page of up to count objects of this class,
+           and the cursor for the next page (None when there are no more).
+            :param cls: The class of the objects.
+            :param cursor: The cursor returned for the previous page,
+                           or None for the first one.
+            :param count: The max. number of objects in the page.
+        """
+        return self.__page(cls, None, cursor, count)
+
+    def filter_page(self, cls: type, pred: Callable,
+                    cursor: "str|None"=None,
+                    count: int=10) -> "tuple[list[object], str|None]":
+        """Returns a page of up to count objects compliant with pred,
+           and the cursor for the next page (None when there are no more).
+            :param cls: The class of the objects.
+            :param pred: The predicate objects must comply with.
+            :param cursor: The cursor returned for the previous page,
+                           or None for the first one.
+            :param count: The max. number of objects in the page.
+        """
+        return self.__page(cls, pred, cursor, count)
+
+    def __page(self, cls: type, pred: "Callable|None",
+               cursor: "str|None", count: int
+               ) -> "tuple[list[object], str|None]":
+        """Retrieves a page resuming the HSCAN encoded in the cursor.
+           Entries scanned but not yet returned are kept in the cursor,
+           so each page costs O(count) no matter its depth.
+           The cursor also keeps the server scanned, since HSCAN cursors
+           are only valid on the server which returned them.
+        """
+        ns = codec_for(cls).namespace
+        count = max(1, count)
+        server, scan_cursor, pending = Sirope.__decode_page_cursor(cursor)
+        toret = []
+
+        if server is None:
+            client = self._reader(ns)
+            server = self._replicas.index_of(client)
+        else:
+            client = self._replicas.server(server)
+
+        while len(toret) < count and (pending or scan_cursor is not None):
+            if pending:
+                keys = pending
+                batch = [(k, v) for k, v in zip(keys, client.hmget(ns, *keys))
+                                if v is not None]
+            else:
+                scan_cursor, data = client.hscan(ns, scan_cursor,
+                                                 count=count)
+                batch = list(data.items())
+                scan_cursor = scan_cursor or None
+
+            pending = []
+            for i, (_, json_obj) in enumerate(batch):
+                if len(toret) >= count:
+                    pending = [k for k, _ in batch[i:]]
+                    break
+
+                obj = Sirope.__obj_from_json(cls, json_obj)
+                if not pred or pred(obj):
+                    toret.append(obj)
+
+        next_cursor = None
+        if pending or scan_cursor is not None:
+            next_cursor = Sirope.__encode_page_cursor(server, scan_cursor,
+                                                      pending)
+
+        return toret, next_cursor
+
+    @staticmethod
+    def __encode_page_cursor(server: int, scan_cursor: "int|None",
+                             pending: "list[bytes]") -> str:
+        data = {"s": server,
+                "c": scan_cursor,
+                "p": [k.decode("utf-8", "replace") if isinstance(k, bytes)
+                        else str(k)
+                      for k in pending]}
+        return base64.urlsafe_b64encode(
+                    json.dumps(data, separators=(',', ':')).encode()
+               ).decode("ascii")
+
+    @staticmethod
+    def __decode_page_cursor(cursor: "str|None"
+                             ) -> "tuple[int|None, int|None, list[str]]":
+        if not cursor:
+            return None, 0, []
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return int(data["s"]), data["c"], list(data["p"])
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("invalid page cursor: " + str(cursor))
+
+    def aggregate(self, cls: type, group_by: "str|None"=None,
+                  metrics: "dict[str, Metric]|None"=None,
+                  where: "dict|None"=None, chunk_size: int=0) -> dict:
+        """Computes metrics over the objects of this class inside Redis,
+           through a Lua script run over chunks of the hash, so objects
+           are neither transferred nor decoded in the client.
+           Values are handled as doubles by Lua, so sums and averages
+           (and integers beyond 2**53) are subject to rounding.
+            :param cls: The class of the objects.
+            :param group_by: The field to group objects by, or None.
+            :param metrics: Metrics by name, such as {"n": count()}.
+            :param where: Values (str, number, bool) fields must equal.
+            :param chunk_size: Entries per chunk (the default if 0).
+            :return: {group value: {metric name: value}} or,
+                     without group_by, {metric name: value}.
+        """
+        ns = codec_for(cls).namespace
+        metrics = metrics or {"n": count()}
+        spec = {"count": chunk_size or self._chunk_size,
+                "group_by": group_by or False,
+                "fields": sorted({m.field for m in metrics.values()
+                                          if m.field}),
+                "where": where or {}}
+        client = self._reader(ns)
+        groups = {}
+        cursor = 0
+
+        while True:
+            spec["cursor"] = cursor
+            partial = json.loads(self._aggregate_script(
+                                                keys=[ns],
+                                                args=[json.dumps(spec)],
+                                                client=client))
+
+            # Empty Lua tables may be encoded as JSON arrays
+            for key, partial_group in (partial["groups"] or {}).items():
+                if key.startswith("{"):
+                    key = json.dumps(json.loads(key), sort_keys=True)
+
+                Sirope.__merge_group(groups.setdefault(key, {"c": 0, "f": {}}),
+                                     partial_group)
+
+            cursor = int(partial["cursor"])
+            if cursor == 0:
+                break
+
+        toret = {}
+        for key, group in groups.items():
+            value = JSONDCoder.convert(json.loads(key))
+
+            if isinstance(value, (dict, list)):
+                value = key
+
+            toret[value] = {name: m.result(group["c"],
+                                           group["f"].get(m.field))
+                            for name, m in metrics.items()}
+
+        if not group_by:
+            toret = toret.get(None) or {name: m.result(0, None)
+                                        for name, m in metrics.items()}
+
+        return toret
+
+    @staticmethod
+    def __merge_group(group: dict, partial_group: dict):
+        group["c"] += partial_group["c"]
+
+        for field, partial_stats in (partial_group["f"] or {}).items():
+            stats = group["f"].get(field)
+
+            for name in ("s", "mn", "mx"):
+                partial_stats[name] = Sirope.__number(partial_stats[name])
+
+            if not stats:
+                group["f"][field] = partial_stats
+            else:
+                stats["n"] += partial_stats["n"]
+                stats["s"] += partial_stats["s"]
+                stats["mn"] = min(stats["mn"], partial_stats["mn"])
+                stats["mx"] = max(stats["mx"], partial_stats["mx"])
+
+    @staticmethod
+    def __number(txt: str) -> "int|float":
+        """Parses a number formatted by Lua with '%.17g'."""
+        try:
+            return int(txt)
+        except ValueError:
+            return float(txt)
+
+    def export(self, cls: type, fileobj: IO[str], chunk_size: int=0,
+               progress: "Callable[[int, float], None]|None"=None) -> int:
+        """Writes the objects of this class, their safe indexes and
+           the next id of the class, as NDJSON, streamed in chunks.
+            :param cls: The class.
+            :param fileobj: A text file to write to.
+            :param chunk_size: Objects per chunk (the default if 0).
+            :param progress: Called after each chunk with the number
+                             of objects and the elapsed seconds.
+            :return: The number of objects exported.
+        """
+        return transfer.export_ns(self, codec_for(cls).namespace, fileobj,
+                                  chunk_size or self._chunk_size, progress)
+
+    def import_(self, fileobj: IO[str], chunk_size: int=0,
+                progress: "Callable[[int, float], None]|None"=None) -> int:
+        """Reads objects written by export(), keeping their oids,
+           and saving them in pipelined batches.
+            :param fileobj: A text file to read from.
+            :param chunk_size: Lines per batch (the default if 0).
+            :param progress: Called after each batch with the number
+                             of objects and the elapsed seconds.
+            :return: The number of objects imported.
+        """
+        return transfer.import_ns(self, fileobj,
+                                  chunk_size or self._chunk_size, progress)
+
+    def to_columns(self, cls: type, fields: "list[str]",
+                   where: "dict|None"=None, chunk_size: int=0,
+                   arrow: "bool|None"=None):
+        """Extracts these fields of the objects of this class into
+           typed columns, streaming the hash in chunks and decoding
+           only the JSON. Dates, times and datetimes become temporal
+           columns. Needs numpy, and pyarrow for arrow=True.
+            :param cls: The class.
+            :param fields: The names of the fields.
+            :param where: Values (str, number, bool) fields must equal.
+            :param chunk_size: Objects per chunk (the default if 0).
+            :param arrow: True for a pyarrow Table, False for a dict of
+                          numpy arrays, None for pyarrow if available.
+        """
+        return columns.to_columns(self, codec_for(cls).namespace, fields,
+                                  where, chunk_size or self._chunk_size,
+                                  arrow)
+
     def oid_from_safe(self, safe_oid: str) -> OID:
         return self._indexes.get_for(safe_oid)
 
@@ -214,16 +1190,4 @@ class Sirope:
         if not json_txt:
             raise ValueError("invalid json source")
 
-        toret: object = object.__new__(cls)
-
-        if isinstance(json_txt, bytes):
-            json_txt = json_txt.decode("utf-8", "replace")
-
-        obj_dict = JSONDCoder().decode(json_txt)
-        obj_dict.pop("__class__", None)
-        toret.__dict__ = obj_dict
-        return toret
-
-    @staticmethod
-    def __json_from_obj(obj: object) -> str:
-        return JSONCoder().encode(obj.__dict__)
+        return codec_for(cls).decode(json_txt)
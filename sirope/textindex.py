@@ -0,0 +1,108 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import re
+import unicodedata
+
+
+class TextIndex:
+    """An inverted index of the words in a string field of a class,
+       with a set of nums per token, and a num->tokens hash
+       to find the postings to remove on changes.
+       Words are case and accent insensitive. With ngrams,
+       words are indexed by their n-grams, so fragments of words
+       (of at least n chars) can be searched.
+    """
+    PREFIX = "__text__:"
+    REV_PREFIX = "__text_rev__:"
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, ns: str, field: str, ngrams: int=0):
+        self._ns = ns
+        self._field = field
+        self._ngrams = max(0, ngrams)
+
+    @property
+    def field(self) -> str:
+        return self._field
+
+    @property
+    def ngrams(self) -> int:
+        return self._ngrams
+
+    @property
+    def prefix(self) -> str:
+        return TextIndex.PREFIX + self._ns + ":" + self._field + ":"
+
+    @property
+    def rev_index(self) -> str:
+        return TextIndex.REV_PREFIX + self._ns + ":" + self._field
+
+    def key_for(self, token: str) -> str:
+        """Returns the name of the set of nums for this token."""
+        return self.prefix + token
+
+    def spec(self, keys) -> list:
+        """Returns the spec for the Lua scripts.
+            :param keys: The KeyList of the script call.
+        """
+        return [self._field, keys.index(self.rev_index)]
+
+    def tokens_spec(self, keys, old: "bytes|None",
+                    tokens: "list[str]|None"=None) -> dict:
+        """Returns the spec of the tokens of an object for the Lua scripts.
+            :param keys: The KeyList of the script call.
+            :param old: The tokens stored in the reverse index, or None.
+            :param tokens: The new tokens, or None when deleting.
+        """
+        old = old.decode("utf-8") if old else False
+        toret = {"old": old,
+                 "old_keys": [keys.index(self.key_for(token))
+                              for token in (old or "").split()]}
+
+        if tokens is not None:
+            toret["tokens"] = " ".join(tokens)
+            toret["keys"] = [keys.index(self.key_for(token))
+                             for token in tokens]
+
+        return toret
+
+    def tokens(self, value: object) -> "list[str]":
+        """Returns the tokens to index for this value of the field."""
+        toret = set()
+
+        if isinstance(value, str):
+            for word in TextIndex.words(value):
+                toret.update(self.__grams(word))
+
+        return sorted(toret)
+
+    def matches(self, value: object, text: str) -> bool:
+        """Determines whether the words of text are in value,
+           as fragments when indexing n-grams.
+        """
+        if not isinstance(value, str):
+            return False
+
+        words = TextIndex.words(value)
+
+        if self._ngrams:
+            value = " ".join(words)
+            return all(word in value for word in TextIndex.words(text))
+
+        return set(TextIndex.words(text)) <= set(words)
+
+    def __grams(self, word: str) -> "list[str]":
+        n = self._ngrams
+
+        if not n or len(word) <= n:
+            return [word]
+
+        return [word[i:i + n] for i in range(len(word) - n + 1)]
+
+    @staticmethod
+    def words(text: str) -> "list[str]":
+        """Returns the words of text, in lower case and with no accents."""
+        text = unicodedata.normalize("NFKD", text.casefold())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        return TextIndex.WORD.findall(text)
@@ -0,0 +1,134 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+# Export and import of classes as NDJSON, with a JSON document per line:
+#   {"t": "c", "ns": <namespace>, "next": <next id>}: a class follows.
+#   {"t": "o", "n": <num>, "v": <object>}: an object of the class.
+#   {"t": "s", "n": <num>, "s": <safe oid>}: the safe index of an object.
+
+
+import json
+import time
+from typing import Callable
+from typing import IO
+
+from sirope.oid import OID
+from sirope.safeindex import SafeIndex
+
+
+def export_ns(sirope, ns: str, fileobj: IO[str], chunk_size: int=500,
+              progress: "Callable[[int, float], None]|None"=None) -> int:
+    """Writes the objects of a namespace and their safe indexes,
+       reading them in chunks.
+        :param sirope: The Sirope object to read from.
+        :param ns: The namespace (full name of the class).
+        :param fileobj: A text file to write to.
+        :param chunk_size: Number of objects per chunk.
+        :param progress: Called after each chunk with the number
+                         of objects and the elapsed seconds, or None.
+        :return: The number of objects exported.
+    """
+    client = sirope._reader(ns)
+    start = time.perf_counter()
+    next_id = client.hget(sirope.NEXT_IDS_ID, ns)
+    fileobj.write(json.dumps({"t": "c", "ns": ns,
+                              "next": int(next_id or 0)}) + "\n")
+
+    toret = 0
+    cursor = 0
+    while True:
+        cursor, data = client.hscan(ns, cursor, count=chunk_size)
+
+        if data:
+            nums = [num.decode("utf-8", "replace") for num in data]
+            lines = []
+
+            for num, json_obj in zip(nums, data.values()):
+                lines.append('{"t":"o","n":"' + num + '","v":'
+                             + json_obj.decode("utf-8", "replace") + "}\n")
+
+            soids = client.hmget(SafeIndex.OIDS_INDEXES_STORE_NAME,
+                                 *[ns + "@" + num for num in nums])
+
+            for num, soid in zip(nums, soids):
+                if soid:
+                    lines.append(json.dumps({
+                                    "t": "s", "n": num,
+                                    "s": soid.decode("utf-8", "replace")})
+                                 + "\n")
+
+            fileobj.write("".join(lines))
+            toret += len(data)
+
+            if progress:
+                progress(toret, time.perf_counter() - start)
+
+        if cursor == 0:
+            break
+
+    return toret
+
+
+def import_ns(sirope, fileobj: IO[str], chunk_size: int=500,
+              progress: "Callable[[int, float], None]|None"=None) -> int:
+    """Reads objects and safe indexes exported with export_ns(),
+       writing them in pipelined batches. Objects keep their oids,
+       and the next id of each class is raised to the exported one.
+        :param sirope: The Sirope object to write to.
+        :param fileobj: A text file to read from.
+        :param chunk_size: Number of lines per batch.
+        :param progress: Called after each batch with the number
+                         of objects and the elapsed seconds, or None.
+        :return: The number of objects imported.
+    """
+    client = sirope._redis
+    start = time.perf_counter()
+    pipe = client.pipeline(transaction=False)
+    saves = []
+    ns = None
+    num_lines = 0
+    toret = 0
+
+    for line in fileobj:
+        line = line.strip()
+
+        if not line:
+            continue
+
+        record = json.loads(line)
+        kind = record.get("t")
+
+        if kind == "c":
+            ns = record["ns"]
+            next_id = client.hget(sirope.NEXT_IDS_ID, ns)
+
+            if int(next_id or 0) < record["next"]:
+                client.hset(sirope.NEXT_IDS_ID, ns, record["next"])
+        elif ns is None:
+            raise ValueError("import: object found before its class")
+        elif kind == "o":
+            oid = OID.from_pair((ns, record["n"]))
+            saves.append((oid, json.dumps(record["v"]), None))
+            toret += 1
+        elif kind == "s":
+            toid = ns + "@" + record["n"]
+            pipe.hset(SafeIndex.INDEXES_OIDS_STORE_NAME, record["s"], toid)
+            pipe.hset(SafeIndex.OIDS_INDEXES_STORE_NAME, toid, record["s"])
+        else:
+            raise ValueError("import: invalid record: " + line[:80])
+
+        num_lines += 1
+        if num_lines % chunk_size == 0:
+            sirope._write_json(saves, [])
+            pipe.execute()
+            saves = []
+
+            if progress:
+                progress(toret, time.perf_counter() - start)
+
+    sirope._write_json(saves, [])
+    pipe.execute()
+
+    if progress:
+        progress(toret, time.perf_counter() - start)
+
+    return toret
@@ -0,0 +1,96 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import json
+
+from sirope.coders import JSONCoder
+
+
+class UniqueConstraintError(ValueError):
+    """Raised when saving an object would duplicate a unique field."""
+    def __init__(self, ns: str, field: str):
+        super().__init__(f"{ns}: duplicated value for unique field '{field}'")
+        self._ns = ns
+        self._field = field
+
+    @property
+    def namespace(self) -> str:
+        return self._ns
+
+    @property
+    def field(self) -> str:
+        return self._field
+
+    @staticmethod
+    def from_response_error(exc: Exception) -> "UniqueConstraintError|None":
+        """Returns the violation reported by a Lua script in this error,
+           or None if it is not a violation.
+        """
+        toret = None
+        msg = str(exc)
+        pos = msg.find(UniqueConstraint.ERROR_PREFIX)
+
+        if pos >= 0:
+            parts = msg[pos + len(UniqueConstraint.ERROR_PREFIX):].split()
+
+            if len(parts) >= 2:
+                toret = UniqueConstraintError(parts[0], parts[1])
+
+        return toret
+
+
+class UniqueConstraint:
+    """A unique field of a class, backed by a value->num hash,
+       and a num->value hash to find the value to remove on changes.
+       None values are not indexed, so they can be repeated.
+    """
+    PREFIX = "__unique__:"
+    REV_PREFIX = "__unique_rev__:"
+    ERROR_PREFIX = "UNIQUE "
+
+    _encoder = JSONCoder()
+
+    def __init__(self, ns: str, field: str):
+        self._ns = ns
+        self._field = field
+
+    @property
+    def field(self) -> str:
+        return self._field
+
+    @property
+    def index(self) -> str:
+        return UniqueConstraint.PREFIX + self._ns + ":" + self._field
+
+    @property
+    def rev_index(self) -> str:
+        return UniqueConstraint.REV_PREFIX + self._ns + ":" + self._field
+
+    def spec(self, keys) -> list:
+        """Returns the spec for the Lua scripts.
+            :param keys: The KeyList of the script call.
+        """
+        return [self._field, keys.index(self.index),
+                keys.index(self.rev_index)]
+
+    def key_for_obj(self, obj_dict: dict) -> "str|bool":
+        """Returns the key in the index for this object.
+            :param obj_dict: The JSON of the object, decoded with no hook.
+        """
+        return UniqueConstraint.key_for(obj_dict.get(self._field))
+
+    def key_for_value(self, value: object) -> "str|bool":
+        """Returns the key in the index for this value of the field."""
+        return UniqueConstraint.key_for(
+                    json.loads(UniqueConstraint._encoder.encode(value)))
+
+    @staticmethod
+    def key_for(json_value: object) -> "str|bool":
+        """Returns the key in the index for this value decoded from JSON,
+           or False for None. All values are encoded as JSON,
+           so values of different types (such as "1" and 1) differ.
+        """
+        if json_value is None:
+            return False
+
+        return json.dumps(json_value, sort_keys=True, separators=(',', ':'))
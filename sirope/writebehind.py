@@ -0,0 +1,191 @@
+# Sirope (c) Baltasar 2022 MIT License <baltasarq@gmail.com>
+
+
+import time
+import itertools
+import threading
+
+from sirope.oid import OID
+from sirope.registry import codec_for
+
+
+class WriteBehindError(Exception):
+    """Raised when some queued saves could not be written."""
+    def __init__(self, errors: "dict[OID, Exception]"):
+        first = next(iter(errors.values()))
+        super().__init__(f"{len(errors)} queued saves failed: {first}")
+        self._errors = dict(errors)
+
+    @property
+    def oids(self) -> "list[OID]":
+        return list(self._errors)
+
+    @property
+    def errors(self) -> "dict[OID, Exception]":
+        return dict(self._errors)
+
+
+class WriteBehind:
+    """Saves objects in the background, coalescing repeated saves.
+       The state of an object is captured when save() is called;
+       if it is saved again before being written, only the latest
+       state is written. If a batch fails, its objects are written
+       one by one, so only the failing ones are lost. Then
+       a WriteBehindError with their OIDs is raised by the next call
+       to save(), flush() or close().
+    """
+    def __init__(self, sirope, max_batch: int=500, max_delay: float=0.05,
+                 max_pending: int=10000):
+        """Creates a write-behind saver, starting its thread.
+            :param sirope: The Sirope object to write through.
+            :param max_batch: Max. number of objects written per batch.
+            :param max_delay: Max. seconds a save waits to be written.
+            :param max_pending: Max. number of objects waiting to be written.
+        """
+        self._sirope = sirope
+        self._max_batch = max(1, max_batch)
+        self._max_delay = max_delay
+        self._max_pending = max(self._max_batch, max_pending)
+        self._pending: "dict[OID, str]" = {}
+        self._oldest = 0.0
+        self._in_flight = 0
+        self._flushing = 0
+        self._closed = False
+        self._errors: "dict[OID, Exception]" = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self.__run,
+                                        name="sirope-write-behind",
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "WriteBehind":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def save(self, obj: object) -> OID:
+        """Queues the save of this object, returning its OID.
+           Blocks while the queue is full.
+        """
+        oid = self._sirope._oid_for(obj)
+        json_obj = codec_for(obj.__class__).encode(obj)
+
+        with self._cond:
+            self.__raise_error()
+
+            while (not self._closed
+               and oid not in self._pending
+               and len(self._pending) >= self._max_pending):
+                self._cond.wait()
+
+            if self._closed:
+                raise RuntimeError("write-behind saver is closed")
+
+            if not self._pending:
+                self._oldest = time.monotonic()
+
+            self._pending[oid] = json_obj
+            self._cond.notify_all()
+
+        return oid
+
+    def flush(self):
+        """Blocks until all queued saves are written."""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+
+            try:
+                while self._pending or self._in_flight:
+                    self._cond.wait()
+            finally:
+                self._flushing -= 1
+
+            self.__raise_error()
+
+    def close(self):
+        """Writes all queued saves and stops the background thread."""
+        if not self._closed:
+            try:
+                self.flush()
+            finally:
+                with self._cond:
+                    self._closed = True
+                    self._cond.notify_all()
+
+                self._thread.join()
+
+    def __raise_error(self):
+        if self._errors:
+            errors = self._errors
+            self._errors = {}
+            raise WriteBehindError(errors) from next(iter(errors.values()))
+
+    def __next_batch(self) -> "list[tuple[OID, str]]":
+        """Waits for a batch to be due, and takes it from the queue."""
+        with self._cond:
+            while not self._closed:
+                if (len(self._pending) >= self._max_batch
+                 or (self._pending and self._flushing)):
+                    break
+
+                if self._pending:
+                    remaining = self._oldest + self._max_delay - time.monotonic()
+
+                    if remaining <= 0:
+                        break
+
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+
+            oids = list(itertools.islice(self._pending, self._max_batch))
+            toret = [(oid, self._pending.pop(oid)) for oid in oids]
+            self._in_flight += 1
+            self._cond.notify_all()
+
+        return toret
+
+    def __write(self, batch: "list[tuple[OID, str]]"
+                ) -> "dict[OID, Exception]":
+        """Writes a batch, writing its objects one by one if it fails.
+            :return: The errors of the objects not written, by OID.
+        """
+        try:
+            self._sirope._write_json([(oid, json_obj, None)
+                                      for oid, json_obj in batch], [])
+            return {}
+        except Exception as exc:
+            if len(batch) == 1:
+                return {batch[0][0]: exc}
+
+        toret = {}
+        for entry in batch:
+            toret.update(self.__write([entry]))
+
+        return toret
+
+    def __run(self):
+        while True:
+            batch = self.__next_batch()
+            errors = {}
+
+            try:
+                if batch:
+                    errors = self.__write(batch)
+            finally:
+                with self._cond:
+                    for oid, _ in batch:
+                        self._errors.pop(oid, None)
+
+                    self._errors.update(errors)
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+            if not batch and self._closed:
+                break
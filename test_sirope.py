@@ -2,9 +2,17 @@
 
 
 import unittest
+import unittest.mock
 
 import sirope
+import os
+import io
+import time
 import datetime
+import math
+import tracemalloc
+import importlib.util
+import redis
 
 
 class Person:
@@ -56,6 +64,38 @@ class Person:
     def __str__(self):
         return f"{self.name} ({self.born}): {self.email}"
 
+BACKEND = os.environ.get("SIROPE_TEST_BACKEND", "redis")
+needs_redis = unittest.skipUnless(BACKEND == "redis", "needs Redis")
+
+
+def new_backend():
+    """Returns the storage chosen with SIROPE_TEST_BACKEND:
+       redis (default), memory or sqlite.
+    """
+    if BACKEND == "memory":
+        return sirope.MemoryBackend()
+    elif BACKEND == "sqlite":
+        return sirope.SQLiteBackend()
+
+    return redis.Redis()
+
+
+class Point:
+    __slots__ = ("__oid__", "_x", "_y", "_when")
+    _x: int
+    _y: int
+
+    def __init__(self, x: int, y: int, when: datetime.datetime):
+        self._x = x
+        self._y = y
+        self._when = when
+
+    def __eq__(self, other: object):
+        return (isinstance(other, Point)
+                and (self._x, self._y, self._when)
+                        == (other._x, other._y, other._when))
+
+
 """
 class TestSafeIndex(unittest.TestCase):
     def setUp(self) -> None:
@@ -135,7 +175,7 @@ class TestSirope(unittest.TestCase):
                           datetime.datetime.now().time(),
                           b"hola,rosa")
 
-        self._sirope = sirope.Sirope()
+        self._sirope = sirope.Sirope(new_backend())
 
     def tearDown(self) -> None:
         super().tearDown()
@@ -259,6 +299,32 @@ class TestSirope(unittest.TestCase):
         self._sirope.multi_delete([self._oid1, self._oid2])
         self.assertEqual(0, self._sirope.num_objs(Person))
 
+    @needs_redis
+    def test_multi_delete_safe_indexes(self):
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+        self._sirope.safe_from_oid(oid1)
+        indexes = self._sirope._indexes
+        read_for = indexes.read_for
+        reads = []
+
+        # A safe index created between the read and the deletion;
+        # embedded backends lock other threads out instead
+        def racing_read_for(pipe, oids):
+            toret = read_for(pipe, oids)
+
+            if not reads:
+                sirope.Sirope(self._sirope._redis).safe_from_oid(oid2)
+
+            reads.append(oids)
+            return toret
+
+        indexes.read_for = racing_read_for
+        self._sirope.multi_delete([oid1, oid2])
+
+        self.assertEqual(0, self._sirope.num_objs(Person))
+        self.assertEqual(0, self._sirope.num_safe_indexes())
+
     def test_multi_load(self):
         if not self._sirope.exists(self._oid1):
             self._sirope.save(self._p1)
@@ -277,6 +343,26 @@ class TestSirope(unittest.TestCase):
         self._sirope.delete(self._oid1)
         self._sirope.delete(self._oid2)
 
+    def test_multi_load_ordered(self):
+        if not self._sirope.exists(self._oid1):
+            self._sirope.save(self._p1)
+
+        if not self._sirope.exists(self._oid2):
+            self._sirope.save(self._p2)
+
+        missing = sirope.OID(Person, 100)
+        oids = [self._oid2, missing, self._oid1, self._oid2]
+
+        lps = list(self._sirope.multi_load_ordered(oids, chunk_size=1))
+        self.assertEqual([self._p2, None, self._p1, self._p2], lps)
+        self.assertIs(lps[0], lps[3])
+
+        lps = list(self._sirope.multi_load_ordered(oids, skip_missing=True))
+        self.assertEqual([self._p2, self._p1, self._p2], lps)
+
+        self._sirope.delete(self._oid1)
+        self._sirope.delete(self._oid2)
+
     def test_load_all_oids(self):
         if not self._sirope.exists(self._oid1):
             self._sirope.save(self._p1)
@@ -487,6 +573,686 @@ class TestSirope(unittest.TestCase):
         self._sirope.multi_delete([self._oid1, self._oid2, oid3, oid4])
         self.assertNotEqual(oid3, oid4)
 
+    def test_replicas(self):
+        class SlowReplica(sirope.MemoryBackend):
+            def ping(self, **kwargs) -> bool:
+                time.sleep(0.02)
+                return True
+
+        class DownReplica(sirope.MemoryBackend):
+            def ping(self, **kwargs) -> bool:
+                raise redis.ConnectionError("replica down")
+
+        primary = sirope.MemoryBackend()
+        replica1 = sirope.MemoryBackend()
+        replica2 = sirope.MemoryBackend()
+
+        # Round robin
+        replicas = sirope.ReplicaSet(primary, [replica1, replica2])
+        self.assertEqual([replica1, replica2, replica1],
+                         [replicas.for_read("ns") for _ in range(3)])
+
+        # Least latency, falling back to the primary with all replicas down
+        slow = SlowReplica()
+        replicas = sirope.ReplicaSet(primary, [slow, replica1],
+                                     policy=sirope.ReplicaSet.LEAST_LATENCY)
+        self.assertIs(replica1, replicas.for_read("ns"))
+        self.assertIs(replica1, replicas.for_read("ns"))
+
+        replicas = sirope.ReplicaSet(primary, [DownReplica(), slow],
+                                     policy=sirope.ReplicaSet.LEAST_LATENCY)
+        self.assertIs(slow, replicas.for_read("ns"))
+
+        replicas = sirope.ReplicaSet(primary, [DownReplica(), DownReplica()],
+                                     policy=sirope.ReplicaSet.LEAST_LATENCY)
+        self.assertIs(primary, replicas.for_read("ns"))
+
+        # Read your writes: the replica never receives the object,
+        # so it is only found while reads stay on the primary.
+        srp = sirope.Sirope(primary, replicas=[replica1],
+                            read_your_writes=0.05)
+        oid = srp.save(self._p1)
+        self.assertTrue(srp.exists(oid))
+        self.assertEqual(self._p1, srp.load(oid))
+
+        time.sleep(0.1)
+        self.assertFalse(srp.exists(oid))
+        self.assertTrue(primary.hexists(oid.namespace, str(oid.num)))
+
+        # Paging stays on the server of the first page
+        for prefix, replica in (("A", replica1), ("B", replica2)):
+            for i in range(25):
+                sirope.Sirope(replica).save(
+                            Person(prefix + str(i), self._p1.born,
+                                   self._p1.email, self._p1.creation_date,
+                                   self._p1.creation_time, b"hola"))
+
+        srp = sirope.Sirope(primary, replicas=[replica1, replica2])
+        names = []
+        cursor = None
+        while True:
+            page, cursor = srp.enumerate_page(Person, cursor, 10)
+            names.extend(p.name for p in page)
+
+            if not cursor:
+                break
+
+        self.assertEqual(25, len(set(names)))
+        self.assertEqual(1, len({name[0] for name in names}))
+
+    def test_load_all_bounded_memory(self):
+        num_persons = 2000
+        for i in range(num_persons):
+            p = Person("Person" + str(i),
+                       datetime.datetime(1970, 1, 1),
+                       "person" + str(i) + "@gmail.com",
+                       datetime.datetime.now().date(),
+                       datetime.datetime.now().time(),
+                       b"x" * 512)
+            self._sirope.save(p)
+
+        ns = self._oid1.namespace
+        total_size = sum(len(v) for v in self._sirope._redis.hvals(ns))
+
+        tracemalloc.start()
+        num = sum(1 for _ in self._sirope.load_all(Person, chunk_size=50))
+        num_keys = sum(1 for _ in self._sirope.load_all_keys(Person,
+                                                            chunk_size=50))
+        _, stream_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(num_persons, num)
+        self.assertEqual(num_persons, num_keys)
+        self.assertLess(stream_peak, total_size / 4)
+
+    def test_enumerate_page(self):
+        for i in range(25):
+            self._sirope.save(Person("Person" + str(i),
+                                     datetime.datetime(1970 + i, 1, 1),
+                                     "person" + str(i) + "@gmail.com",
+                                     datetime.datetime.now().date(),
+                                     datetime.datetime.now().time(),
+                                     b"hola"))
+
+        names = []
+        cursor = None
+        num_pages = 0
+        while True:
+            page, cursor = self._sirope.enumerate_page(Person, cursor, 10)
+            self.assertLessEqual(len(page), 10)
+            names.extend(p.name for p in page)
+            num_pages += 1
+
+            if not cursor:
+                break
+
+        self.assertEqual(25, len(names))
+        self.assertEqual(25, len(set(names)))
+        self.assertGreaterEqual(num_pages, 3)
+
+        born = []
+        cursor = None
+        while True:
+            page, cursor = self._sirope.filter_page(
+                                Person, lambda p: p.born.year % 2 == 0,
+                                cursor, 4)
+            born.extend(p.born.year for p in page)
+
+            if not cursor:
+                break
+
+        self.assertEqual(sorted(range(1970, 1995, 2)), sorted(born))
+        self.assertRaises(ValueError,
+                          lambda: self._sirope.enumerate_page(Person, "xx"))
+
+    def test_register_slots(self):
+        class NoOid:
+            __slots__ = ("_x",)
+
+        sirope.register(Point)
+        self.assertRaises(TypeError, lambda: sirope.register(NoOid))
+
+        p = Point(1, 2, datetime.datetime(2022, 1, 1, 10, 30))
+        oid = self._sirope.save(p)
+        self.assertEqual(oid, p.__oid__)
+
+        p2 = self._sirope.load(oid)
+        self.assertEqual(p, p2)
+        self.assertEqual(oid, p2.__oid__)
+        self.assertEqual([p], list(self._sirope.load_all(Point)))
+
+        self._sirope.delete(oid)
+
+    def test_register_mixed(self):
+        codec = sirope.register(Person, {"_name": str,
+                                         "_born": datetime.datetime,
+                                         "_email": str,
+                                         "_blob": bytes})
+        self.assertTrue(codec._plain_decode)
+
+        hook = unittest.mock.Mock()
+        hook.decode.side_effect = AssertionError("object hook used")
+
+        try:
+            oid = self._sirope.save(self._p1)
+
+            with unittest.mock.patch.object(sirope.registry.ClassCodec,
+                                            "_decoder", hook):
+                p = self._sirope.load(oid)
+
+            self.assertEqual(self._p1, p)
+            self.assertIsInstance(p.born, datetime.datetime)
+            self.assertIsInstance(p.creation_date, datetime.date)
+            self.assertIsInstance(p._blob, bytes)
+            self.assertFalse(hook.decode.called)
+            self._sirope.delete(oid)
+        finally:
+            sirope.register(Person)
+
+    def test_session(self):
+        oid1 = self._sirope.save(self._p1)
+        self._sirope.safe_from_oid(oid1)
+
+        with self._sirope.session() as session:
+            p1 = session.load(oid1)
+            self.assertIs(p1, session.load(oid1))
+
+            oid2 = session.save(self._p2)
+            self.assertEqual(self._oid2, oid2)
+            self.assertFalse(self._sirope.exists(oid2))
+
+            session.delete(oid1)
+            self.assertIsNone(session.load(oid1))
+            self.assertTrue(self._sirope.exists(oid1))
+
+        self.assertFalse(self._sirope.exists(oid1))
+        self.assertEqual(0, self._sirope.num_safe_indexes())
+        self.assertEqual(self._p2, self._sirope.load(oid2))
+
+        try:
+            with self._sirope.session() as session:
+                session.delete(oid2)
+                raise KeyError()
+        except KeyError:
+            pass
+
+        self.assertTrue(self._sirope.exists(oid2))
+        self._sirope.delete(oid2)
+
+    def test_write_behind(self):
+        with self._sirope.write_behind(max_batch=10, max_delay=10) as writer:
+            oid1 = writer.save(self._p1)
+            self.assertEqual(self._oid1, oid1)
+
+            for i in range(100):
+                self._p1._email = "baltasar" + str(i) + "@gmail.com"
+                writer.save(self._p1)
+
+            oid2 = writer.save(self._p2)
+            self.assertEqual(2, len(writer))
+
+            writer.flush()
+            self.assertEqual(0, len(writer))
+            self.assertEqual(self._p1, self._sirope.load(oid1))
+            self.assertEqual(self._p2, self._sirope.load(oid2))
+
+            self._p2._email = "rosa@gmail.com"
+            writer.save(self._p2)
+
+        self.assertEqual(self._p2, self._sirope.load(oid2))
+        self.assertRaises(RuntimeError, lambda: writer.save(self._p1))
+        self._sirope.multi_delete([oid1, oid2])
+
+    @needs_redis
+    def test_write_behind_errors(self):
+        self._sirope.unique(Person, "_email")
+        oid1 = self._sirope.save(self._p1)
+        p3 = Person("Héctor", self._p1.born, "hector@gmail.com",
+                    self._p1.creation_date, self._p1.creation_time, b"hola")
+
+        writer = self._sirope.write_behind(max_batch=10, max_delay=10)
+        self._p2._email = self._p1.email
+        oid2 = writer.save(self._p2)
+        oid3 = writer.save(p3)
+
+        with self.assertRaises(sirope.WriteBehindError) as ctx:
+            writer.flush()
+
+        self.assertEqual([oid2], ctx.exception.oids)
+        self.assertIsInstance(ctx.exception.errors[oid2],
+                              sirope.UniqueConstraintError)
+        self.assertFalse(self._sirope.exists(oid2))
+        self.assertEqual(p3, self._sirope.load(oid3))
+
+        self._p2._email = "rosa@gmail.com"
+        writer.save(self._p2)
+        writer.close()
+        self.assertEqual(self._p2, self._sirope.load(oid2))
+        self._sirope.multi_delete([oid1, oid2, oid3])
+
+    @needs_redis
+    def test_change_feed(self):
+        self._sirope.change_feed(Person, fields=True)
+        consumer = self._sirope.changes(Person, "indexer", "indexer1")
+
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+        self._sirope.safe_from_oid(oid1)
+        self._p1._email = "baltasar@uvigo.es"
+        self._sirope.save(self._p1)
+        self.assertTrue(self._sirope.delete(oid2))
+        self._sirope.multi_delete([oid1])
+
+        changes = consumer.poll(count=10)
+        self.assertEqual(5, len(changes))
+        self.assertEqual([("save", oid1, 1), ("save", oid2, 1),
+                          ("save", oid1, 2), ("delete", oid2, 2),
+                          ("delete", oid1, 3)],
+                         [(c.op, c.oid, c.version) for c, _ in changes])
+        self.assertEqual(["_email"], changes[2][0].fields)
+        self.assertIsNone(changes[0][1])
+        self.assertEqual(0, self._sirope.num_safe_indexes())
+
+        self.assertEqual(5, consumer.ack([c for c, _ in changes]))
+        self.assertEqual([], consumer.poll())
+
+        oid3 = self._sirope.save(self._p2)
+        changes = consumer.poll()
+        self.assertEqual(1, len(changes))
+        self.assertEqual(self._p2, changes[0][1])
+        self._sirope.delete(oid3)
+
+    @needs_redis
+    def test_aggregate(self):
+        cities = ["Ourense", "Vigo", "Ourense", "Ourense", "Vigo"]
+        for i, city in enumerate(cities):
+            p = Person("Person" + str(i),
+                       datetime.datetime(1970 + i, 1, 1),
+                       "person" + str(i) + "@gmail.com",
+                       datetime.datetime.now().date(),
+                       datetime.datetime.now().time(),
+                       b"hola")
+            p._city = city
+            p._age = 20 + i
+            p._ratio = math.pi / (i + 1)
+            p._big = 10 ** 15 + i
+            self._sirope.save(p)
+
+        result = self._sirope.aggregate(
+                            Person, group_by="_city",
+                            metrics={"n": sirope.count(),
+                                     "avg_age": sirope.avg("_age"),
+                                     "max_age": sirope.max_("_age")},
+                            chunk_size=2)
+
+        self.assertEqual({"Ourense": {"n": 3, "avg_age": 65 / 3, "max_age": 23},
+                          "Vigo": {"n": 2, "avg_age": 22.5, "max_age": 24}},
+                         result)
+
+        result = self._sirope.aggregate(
+                            Person,
+                            metrics={"n": sirope.count(),
+                                     "min_age": sirope.min_("_age")},
+                            where={"_city": "Vigo"})
+
+        self.assertEqual({"n": 2, "min_age": 21}, result)
+
+        result = self._sirope.aggregate(
+                            Person,
+                            metrics={"min_ratio": sirope.min_("_ratio"),
+                                     "max_ratio": sirope.max_("_ratio"),
+                                     "sum_big": sirope.sum_("_big")},
+                            chunk_size=2)
+
+        self.assertEqual({"min_ratio": math.pi / 5, "max_ratio": math.pi,
+                          "sum_big": 5 * 10 ** 15 + 10}, result)
+        self.assertEqual({"n": 0}, self._sirope.aggregate(Point))
+        self.assertRaises(ValueError, lambda: sirope.avg(None))
+
+    @needs_redis
+    def test_unique(self):
+        self._sirope.unique(Person, "_email")
+        self._sirope.change_feed(Person)
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+
+        p1 = self._sirope.load_by_unique(Person, "_email",
+                                         "baltasarq@gmail.com")
+        self.assertEqual(self._p1, p1)
+        self.assertIsNone(self._sirope.load_by_unique(Person, "_email", "x"))
+
+        self._p2._email = self._p1.email
+        with self.assertRaises(sirope.UniqueConstraintError) as ctx:
+            self._sirope.save(self._p2)
+
+        self.assertEqual("_email", ctx.exception.field)
+        self.assertEqual("zociguiguigui@gmail.com",
+                         self._sirope.load(oid2).email)
+
+        self._p1._email = "baltasar@uvigo.es"
+        self._sirope.save(self._p1)
+        self._sirope.save(self._p2)
+        self.assertEqual(self._p2, self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+
+        p3 = Person("Héctor",
+                    datetime.datetime(1970, 2, 1),
+                    "baltasarq@gmail.com",
+                    datetime.datetime.now().date(),
+                    datetime.datetime.now().time(),
+                    b"hola, Hector")
+        with self.assertRaises(sirope.UniqueConstraintError):
+            with self._sirope.session() as session:
+                session.delete(oid1)
+                session.save(p3)
+                oid3 = session.save(Person("Rosa",
+                                           datetime.datetime(1984, 1, 1),
+                                           "rosa@gmail.com",
+                                           datetime.datetime.now().date(),
+                                           datetime.datetime.now().time(),
+                                           b"hola,rosa"))
+
+        self.assertTrue(self._sirope.exists(oid1))
+        self.assertFalse(self._sirope.exists(oid3))
+        self.assertEqual(2, self._sirope.num_objs(Person))
+
+        with self._sirope.session() as session:
+            session.delete(oid2)
+            session.save(p3)
+
+        self.assertEqual(p3, self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+
+        self._sirope.multi_delete([oid1, p3.__oid__])
+        self.assertIsNone(self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+
+        self._p1._email = "1"
+        self._p2._email = 1
+        self._sirope.save(self._p1)
+        self._sirope.save(self._p2)
+        self.assertEqual(self._p2,
+                         self._sirope.load_by_unique(Person, "_email", 1))
+        self.assertEqual(self._p1,
+                         self._sirope.load_by_unique(Person, "_email", "1"))
+
+    @needs_redis
+    def test_unique_backfill(self):
+        self._p2._email = self._p1.email
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+
+        self.assertRaises(sirope.UniqueConstraintError,
+                          self._sirope.unique, Person, "_email")
+
+        self._p2._email = "rosa@gmail.com"
+        self._sirope.save(self._p2)
+        self._sirope.unique(Person, "_email")
+        self.assertEqual(self._p2, self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "rosa@gmail.com"))
+
+        self._p2._email = self._p1.email
+        self.assertRaises(sirope.UniqueConstraintError,
+                          self._sirope.save, self._p2)
+
+        self._sirope.multi_delete([oid1, oid2])
+
+    @needs_redis
+    def test_ttl(self):
+        self._sirope.unique(Person, "_email")
+        oid1 = self._sirope.save(self._p1, ttl=0.05)
+        oid2 = self._sirope.save(self._p2, ttl=0.05)
+        self._sirope.save(self._p2)
+        self._sirope.safe_from_oid(oid1)
+        self.assertTrue(self._sirope.exists(oid1))
+
+        time.sleep(0.1)
+        self.assertEqual(1, self._sirope.sweep_expired(Person, batch_size=1))
+        self.assertEqual(0, self._sirope.sweep_expired(Person))
+
+        self.assertFalse(self._sirope.exists(oid1))
+        self.assertTrue(self._sirope.exists(oid2))
+        self.assertEqual(0, self._sirope.num_safe_indexes())
+        self.assertIsNone(self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+
+        self._sirope.delete(oid2)
+
+    @needs_redis
+    def test_ttl_before_sweep(self):
+        self._sirope.unique(Person, "_email")
+        oid1 = self._sirope.save(self._p1, ttl=0.05)
+
+        time.sleep(0.1)
+        self.assertIsNone(self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+        self._p2._email = self._p1.email
+        oid2 = self._sirope.save(self._p2, ttl=0.05)
+        self.assertEqual(self._p2, self._sirope.load_by_unique(
+                                            Person, "_email",
+                                            "baltasarq@gmail.com"))
+
+        # Saved again with no ttl, by a new Sirope object and directly
+        self._p1._email = "baltasar@uvigo.es"
+        self._sirope.save(self._p1, ttl=0.05)
+        sirope.Sirope(self._sirope._redis).save(self._p1)
+        ns = oid2.namespace
+        self._sirope._redis.hset(ns, str(oid2.num),
+                                 self._sirope._redis.hget(ns, str(oid2.num)))
+
+        time.sleep(0.1)
+        self.assertEqual(0, self._sirope.sweep_expired(Person))
+        self.assertTrue(self._sirope.exists(oid1))
+        self.assertTrue(self._sirope.exists(oid2))
+
+        self._sirope.multi_delete([oid1, oid2])
+
+    def test_export_import(self):
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+        soid1 = self._sirope.safe_from_oid(oid1)
+        soid2 = self._sirope.safe_from_oid(oid2)
+        self._sirope.delete(oid2)
+        p3 = Person("Héctor",
+                    datetime.datetime(1970, 2, 1),
+                    "hectorgr@gmail.com",
+                    datetime.datetime.now().date(),
+                    datetime.datetime.now().time(),
+                    b"hola, Hector")
+        oid3 = self._sirope.save(p3)
+
+        reports = []
+        out = io.StringIO()
+        num = self._sirope.export(Person, out, chunk_size=1,
+                                  progress=lambda n, t: reports.append(n))
+        self.assertEqual(2, num)
+        self.assertEqual(2, reports[-1])
+
+        self._sirope._redis.flushdb()
+        num = self._sirope.import_(io.StringIO(out.getvalue()), chunk_size=2)
+
+        self.assertEqual(2, num)
+        self.assertEqual(2, self._sirope.num_objs(Person))
+        self.assertEqual(self._p1, self._sirope.load(oid1))
+        self.assertEqual(p3, self._sirope.load(oid3))
+        self.assertEqual(oid1, self._sirope.oid_from_safe(soid1))
+        self.assertIsNone(self._sirope.oid_from_safe(soid2))
+        self.assertEqual(1, self._sirope.num_safe_indexes())
+
+        oid4 = self._sirope.save(Person("Rosa",
+                                        datetime.datetime(1984, 1, 1),
+                                        "rosa@gmail.com",
+                                        datetime.datetime.now().date(),
+                                        datetime.datetime.now().time(),
+                                        b"hola,rosa"))
+        self.assertEqual(3, oid4.num)
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "needs numpy")
+    def test_to_columns(self):
+        self._p2._age = 40
+        self._sirope.save(self._p1)
+        self._sirope.save(self._p2)
+
+        cols = self._sirope.to_columns(Person, ["_name", "_born", "_age"],
+                                       arrow=False)
+        order = sorted(range(2), key=lambda i: cols["_name"][i])
+        self.assertEqual(["Baltasar", "Rosa"],
+                         [cols["_name"][i] for i in order])
+        self.assertEqual("datetime64[us]", str(cols["_born"].dtype))
+        self.assertEqual(self._p1.born, cols["_born"][order[0]].item())
+        self.assertTrue(cols["_age"].mask[order[0]])
+        self.assertEqual(40, cols["_age"][order[1]])
+
+        cols = self._sirope.to_columns(Person, ["_creation_date"],
+                                       where={"_name": "Rosa"}, arrow=False)
+        self.assertEqual(1, len(cols["_creation_date"]))
+        self.assertEqual(self._p2.creation_date,
+                         cols["_creation_date"][0].item())
+
+        if importlib.util.find_spec("pyarrow"):
+            table = self._sirope.to_columns(Person, ["_name", "_born", "_age",
+                                                     "_creation_time"],
+                                            arrow=True)
+            self.assertEqual(2, table.num_rows)
+            self.assertEqual("timestamp[us]", str(table.column("_born").type))
+            self.assertEqual(1, table.column("_age").null_count)
+            self.assertIn(self._p1.creation_time,
+                          table.column("_creation_time").to_pylist())
+
+            self._p1._age = "unknown"
+            self._sirope.save(self._p1)
+            table = self._sirope.to_columns(Person, ["_name", "_age"])
+            ages = dict(zip(table.column("_name").to_pylist(),
+                            table.column("_age").to_pylist()))
+            self.assertEqual("string", str(table.column("_age").type))
+            self.assertEqual({"Baltasar": '"unknown"', "Rosa": "40"}, ages)
+
+    @needs_redis
+    def test_search(self):
+        self._sirope.text_index(Person, "_name")
+        self._p1._name = "Baltasar García"
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+        self._sirope.text_index(Person, "_email", ngrams=3)
+
+        self.assertEqual([self._p1],
+                         self._sirope.search(Person, "_name", "garcia"))
+        self.assertEqual([], self._sirope.search(Person, "_name", "garc"))
+        self.assertEqual([self._p1, self._p2],
+                         self._sirope.search(Person, "_email", "gmail"))
+        self.assertEqual([self._p1],
+                         self._sirope.search(Person, "_email", "gmail",
+                                             limit=1))
+        self.assertEqual([self._p2],
+                         self._sirope.search(Person, "_email", "guiguigui"))
+        self.assertEqual([], self._sirope.search(Person, "_email", "guiqui"))
+        self.assertRaises(ValueError, self._sirope.search,
+                          Person, "_born", "1970")
+
+        self._p1._name = "Baltasar"
+        self._sirope.save(self._p1)
+        self.assertEqual([], self._sirope.search(Person, "_name", "García"))
+        self.assertEqual([self._p1],
+                         self._sirope.search(Person, "_name", "BALTASAR"))
+
+        self._sirope.delete(oid2)
+        self.assertEqual([self._p1],
+                         self._sirope.search(Person, "_email", "gmail"))
+        self.assertFalse(self._sirope._redis.exists(
+                            "__text__:test_sirope.Person:_email:gui"))
+
+        srp = sirope.Sirope(self._sirope._redis, chunk_size=1)
+        self._sirope._redis.hset("__text_rev__:test_sirope.Person:_name",
+                                 str(oid1.num), "stale")
+        self._sirope._redis.sadd("__text__:test_sirope.Person:_name:stale",
+                                 str(oid1.num))
+        srp.text_index(Person, "_name")
+        self.assertEqual([self._p1], srp.search(Person, "_name", "baltasar"))
+        self.assertEqual([], srp.search(Person, "_name", "stale"))
+        self._sirope.delete(oid1)
+
+    @needs_redis
+    def test_near(self):
+        self._sirope.geo_index(Person, "_lat", "_lon")
+        self._p1._lat, self._p1._lon = 42.3358, -7.8639     # Ourense
+        self._p2._lat, self._p2._lon = 42.2406, -8.7207     # Vigo
+        oid1 = self._sirope.save(self._p1)
+        oid2 = self._sirope.save(self._p2)
+
+        self.assertEqual([self._p2, self._p1],
+                         self._sirope.near(Person, 42.2, -8.7, 100, unit="km"))
+        self.assertEqual([self._p1],
+                         self._sirope.near(Person, 42.3, -7.9, 100,
+                                           limit=1, unit="km"))
+        self.assertEqual([self._p1],
+                         self._sirope.near(Person, 42.3358, -7.8639, 1000))
+        self.assertRaises(ValueError, self._sirope.near,
+                          Point, 42.0, -8.0, 1)
+
+        self._p1._lat = None
+        self._sirope.save(self._p1)
+        self.assertEqual([self._p2],
+                         self._sirope.near(Person, 42.2, -8.7, 100, unit="km"))
+
+        self._p1._lat = 42.3358
+        self._sirope.save(self._p1)
+        srp = sirope.Sirope(self._sirope._redis, chunk_size=1)
+        self._sirope._redis.zrem("__geo__:test_sirope.Person",
+                                 str(oid1.num))
+        srp.geo_index(Person, "_lat", "_lon")
+        self.assertEqual([self._p2, self._p1],
+                         srp.near(Person, 42.2, -8.7, 100, unit="km"))
+
+        self._sirope.delete(oid2)
+        self.assertEqual([self._p1], self._sirope.near(Person, 42.2, -8.7,
+                                                       100, unit="km"))
+        self._sirope.delete(oid1)
+
+    def test_backends(self):
+        for backend in (sirope.MemoryBackend(), sirope.SQLiteBackend()):
+            srp = sirope.Sirope(backend, chunk_size=2)
+            persons = [Person(name, datetime.datetime(1970, 1, 1),
+                              name + "@gmail.com",
+                              datetime.date(2022, 1, 1),
+                              datetime.time(10, 0), b"hola")
+                       for name in ("Baltasar", "Rosa", "Hector")]
+            oids = [srp.save(p) for p in persons]
+
+            self.assertEqual(3, srp.num_objs(Person))
+            self.assertEqual(persons[1], srp.load(oids[1]))
+            self.assertEqual(oids, sorted(srp.load_all_keys(Person),
+                                          key=lambda oid: oid.num))
+            soid = srp.safe_from_oid(oids[1])
+            self.assertEqual(oids[1], srp.oid_from_safe(soid))
+
+            srp.multi_delete(oids[:2])
+            self.assertEqual(persons[2:], list(srp.load_all(Person)))
+            self.assertIsNone(srp.oid_from_safe(soid))
+
+            with self.assertRaises(NotImplementedError):
+                srp.save(persons[0], ttl=60)
+            with self.assertRaises(NotImplementedError):
+                srp.expiring(Person)
+            with self.assertRaises(NotImplementedError):
+                srp.text_index(Person, "_name")
+            with self.assertRaises(NotImplementedError):
+                srp.geo_index(Person, "_lat", "_lon")
+
+            for other in (srp, sirope.Sirope(backend)):
+                other.delete(other.save(persons[0]))
+
+            srp.change_feed(Person)
+            with self.assertRaises(NotImplementedError):
+                srp.save(persons[0])
+
+            self.assertEqual(1, srp.num_objs(Person))
+
 
 if __name__ == "__main__":
     unittest.main()